@@ -0,0 +1,94 @@
+"""
+Measure throughput and peak memory of streaming exports
+
+Each exporter runs in a separate process, so peak RSS is measured in
+isolation. A naive fetchall() export is included for comparison.
+
+Usage: python benchmarks/export.py [rows]
+"""
+
+import os
+import sys
+import csv
+import random
+import shutil
+import sqlite3
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlize as sql
+from sqlize import export
+from sqlize.compat import timer
+
+
+def populate(path, rows, seed=0):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, '
+                 'value REAL, payload TEXT);')
+    conn.executemany(
+        'INSERT INTO events VALUES (?, ?, ?, ?);',
+        ((i, 'kind{}'.format(rnd.randint(0, 9)), rnd.random() * 1000,
+          'x' * rnd.randint(10, 100)) for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+
+def naive(cursor, query, dest):
+    start = timer()
+    rows = cursor.execute(str(query)).fetchall()
+    with open(dest, 'w') as fd:
+        csv.writer(fd).writerows(rows)
+    return export.ExportStats(len(rows), timer() - start)
+
+
+def run(name, db, dest, queue):
+    conn = sqlite3.connect(db)
+    query = sql.Select('*', sets='events')
+    baseline = peak_rss_mb()
+    if name == 'fetchall csv':
+        stats = naive(conn.cursor(), query, dest)
+    elif name == 'csv':
+        stats = export.export_csv(conn.cursor(), query, dest)
+    elif name == 'csv.gz':
+        stats = export.export_csv(conn.cursor(), query, dest + '.gz')
+    elif name == 'ndjson':
+        stats = export.export_ndjson(conn.cursor(), query, dest)
+    elif name == 'ndjson keyset':
+        stats = export.export_ndjson(conn.cursor(), query, dest,
+                                     keyset='id')
+    conn.close()
+    queue.put((stats.rows, stats.rows_per_sec, peak_rss_mb() - baseline))
+
+
+def main(rows=500000):
+    tmpdir = tempfile.mkdtemp()
+    db = os.path.join(tmpdir, 'export.db')
+    try:
+        populate(db, rows)
+        queue = multiprocessing.Queue()
+        for name in ('fetchall csv', 'csv', 'csv.gz', 'ndjson',
+                     'ndjson keyset'):
+            dest = os.path.join(tmpdir, 'out')
+            proc = multiprocessing.Process(target=run,
+                                           args=(name, db, dest, queue))
+            proc.start()
+            count, rate, rss = queue.get()
+            proc.join()
+            print('{:>14}: {} rows, {:10.0f} rows/s, peak RSS +{:.1f} MB'
+                  .format(name, count, rate, rss))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
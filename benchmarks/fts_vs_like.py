@@ -0,0 +1,75 @@
+"""
+Compare FTS5 MATCH queries against LIKE '%term%' scans on a synthetic corpus
+
+Usage: python benchmarks/fts_vs_like.py [rows] [queries]
+"""
+
+import os
+import sys
+import random
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlize as sql
+from sqlize import fts
+from sqlize.compat import timer
+
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'so', 'vi', 'de', 'po')
+
+
+def make_word(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def populate(conn, rows, seed=0):
+    rnd = random.Random(seed)
+    vocabulary = [make_word(rnd) for _ in range(50000)]
+    conn.execute('CREATE TABLE docs (id INTEGER PRIMARY KEY, title TEXT, '
+                 'body TEXT);')
+    conn.executemany(
+        'INSERT INTO docs VALUES (?, ?, ?);',
+        ((i, ' '.join(rnd.sample(vocabulary, 6)),
+          ' '.join(rnd.choice(vocabulary) for _ in range(60)))
+         for i in range(1, rows + 1)))
+    conn.commit()
+    return vocabulary
+
+
+def run(conn, query, terms):
+    start = timer()
+    found = 0
+    for term in terms:
+        found += len(conn.execute(str(query), term).fetchall())
+    return timer() - start, found
+
+
+def main(rows=50000, queries=200):
+    conn = sqlite3.connect(':memory:')
+    vocabulary = populate(conn, rows)
+    rnd = random.Random(1)
+    words = [rnd.choice(vocabulary) for _ in range(queries)]
+
+    table = fts.FTSTable('docs', ['title', 'body'], content_rowid='id')
+    start = timer()
+    conn.executescript(str(table))
+    conn.execute(table.rebuild())
+    conn.commit()
+    print('{} rows, index built in {:.2f}s'.format(rows, timer() - start))
+
+    like = sql.Select('id', sets='docs',
+                      where=sql.Where('title LIKE ?', 'body LIKE ?',
+                                      use_or=True))
+    like_time, _ = run(conn, like, [('%{}%'.format(w),) * 2 for w in words])
+    print('{:>16}: {:8.2f} ms/query'.format(
+        'LIKE', like_time / queries * 1000))
+    for name, rank in (('MATCH', False), ('MATCH + bm25', True)):
+        match = table.search('docs.id', rank=rank)
+        elapsed, _ = run(conn, match, [(w,) for w in words])
+        print('{:>16}: {:8.2f} ms/query, {:.1f}x faster'.format(
+            name, elapsed / queries * 1000, like_time / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,65 @@
+"""
+Measure scaling of parallel rowid-range scans across worker counts
+
+Usage: python benchmarks/parallel_scan.py [rows] [max_workers]
+"""
+
+import os
+import sys
+import random
+import shutil
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlize as sql
+from sqlize import parallel
+from sqlize.compat import timer
+
+
+def populate(path, rows, seed=0):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, '
+                 'value REAL, payload TEXT);')
+    conn.executemany(
+        'INSERT INTO events VALUES (?, ?, ?, ?);',
+        ((i, 'kind{}'.format(rnd.randint(0, 9)), rnd.random() * 1000,
+          'x' * rnd.randint(10, 100)) for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def main(rows=2000000, max_workers=16):
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'scan.db')
+    try:
+        populate(path, rows)
+        query = sql.Select(['kind', 'COUNT(*)', 'SUM(value)', 'MAX(value)'],
+                           sets='events',
+                           where="value > ? AND payload LIKE '%xx%'",
+                           group='kind', order='kind')
+        conn = sqlite3.connect(path)
+        start = timer()
+        expected = conn.execute(str(query), (100,)).fetchall()
+        baseline = timer() - start
+        conn.close()
+        print('{} rows, single connection: {:.3f}s'.format(rows, baseline))
+        workers = 1
+        while workers <= max_workers:
+            with parallel.ParallelScanner(path, workers=workers) as scanner:
+                scanner.select(query, (100,))  # warm up the pool
+                start = timer()
+                result = scanner.select(query, (100,))
+                elapsed = timer() - start
+            assert [r[:2] for r in result] == [r[:2] for r in expected]
+            print('{:>3} workers: {:.3f}s, {:.2f}x'.format(
+                workers, elapsed, baseline / elapsed))
+            workers *= 2
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
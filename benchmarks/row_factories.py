@@ -0,0 +1,75 @@
+"""
+Compare throughput and memory use of row factories
+
+Rows are fetched as plain tuples, ``sqlite3.Row`` objects, dicts, and named
+tuples generated by ``sqlize.rows``. Memory is the average size of a row
+container measured with tracemalloc, excluding the values themselves.
+
+Usage: python benchmarks/row_factories.py [rows]
+"""
+
+import os
+import sys
+import sqlite3
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlize as sql
+from sqlize import rows
+from sqlize.compat import timer
+
+
+def dict_factory(cursor, row):
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
+def populate(conn, count):
+    conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, kind INTEGER, '
+                 'value REAL, flag INTEGER, note TEXT);')
+    # Values are repeated so that they are shared between rows and the
+    # measurement is dominated by row containers
+    conn.executemany('INSERT INTO events VALUES (?, 1, 0.5, 0, NULL);',
+                     ((i,) for i in range(count)))
+
+
+def cursor_for(conn, name, query):
+    cursor = conn.cursor()
+    if name == 'sqlite3.Row':
+        cursor.row_factory = sqlite3.Row
+    elif name == 'dict':
+        cursor.row_factory = dict_factory
+    elif name == 'sqlize.rows':
+        rows.install(cursor, query)
+    return cursor
+
+
+def fetch(conn, name, query):
+    return cursor_for(conn, name, query).execute(str(query)).fetchall()
+
+
+def main(count=200000):
+    conn = sqlite3.connect(':memory:')
+    populate(conn, count)
+    query = sql.Select(['events.id', 'kind', 'value AS v', 'flag', 'note'],
+                       sets='events')
+    names = ('tuple', 'sqlite3.Row', 'dict', 'sqlize.rows')
+    for name in names:
+        fetch(conn, name, query)
+        start = timer()
+        result = fetch(conn, name, query)
+        elapsed = timer() - start
+        del result
+        tracemalloc.start()
+        result = fetch(conn, name, query)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # The list holding the rows is not part of the row cost
+        size -= sys.getsizeof(result)
+        print('{:>12}: {:10.0f} rows/s, {:6.1f} bytes/row'.format(
+            name, count / elapsed, size / float(count)))
+        del result
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
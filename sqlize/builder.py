@@ -8,11 +8,15 @@ This software is free software licensed under the terms of GPLv3. See COPYING
 file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
+import re
+
 try:
     basestring = basestring
 except NameError:
     basestring = (str, bytes)
 
+from .compat import text_type
+
 
 NATURAL = 'NATURAL'
 INNER = 'INNER'
@@ -22,6 +26,14 @@ LEFT_OUTER = 'LEFT OUTER'
 LEFT = 'LEFT'
 JOIN = 'JOIN'
 
+UNION = 'UNION'
+UNION_ALL = 'UNION ALL'
+INTERSECT = 'INTERSECT'
+EXCEPT = 'EXCEPT'
+
+AGGREGATE_RE = re.compile(
+    r'\b(COUNT|SUM|TOTAL|MIN|MAX|AVG|GROUP_CONCAT)\s*\(', re.I)
+
 
 def is_seq(obj):
     """ Returns True if object is not a string but is iterable """
@@ -69,6 +81,10 @@ class BaseClause(SQL):
     def __nonzero__(self):
         return len(self.parts) > 0
 
+    def _append(self, part):
+        self.parts.append(part)
+        return self
+
 
 class Clause(BaseClause):
     keyword = None
@@ -87,8 +103,10 @@ class Clause(BaseClause):
             self.parts.append((connector, p))
 
     def serialize_part(self, connector, part):
+        if not isinstance(part, basestring):
+            part = text_type(part)
         if connector:
-            part = '{} {}'.format(connector, part)
+            part = connector + ' ' + part
         return part + ' '
 
     def serialize(self):
@@ -124,8 +142,7 @@ class From(Clause):
         super(From, self).__init__(*args, **kwargs)
 
     def append(self, table):
-        self.parts.append((self.default_connector, table))
-        return self
+        return self._append((self.default_connector, table))
 
     def join(self, table, kind=None, natural=False, on=None, using=[]):
         if hasattr(table, 'as_subquery'):
@@ -142,8 +159,7 @@ class From(Clause):
             if is_seq(using):
                 using = ', '.join(using)
             table += ' USING ({})'.format(using)
-        self.parts.append((' '.join(j), table))
-        return self
+        return self._append((' '.join(j), table))
 
     def inner_join(self, table, natural=False):
         return self.join(table, self.INNER, natural)
@@ -174,22 +190,25 @@ class Where(Clause):
 
     def and_(self, condition):
         if not self.parts:
-            self.parts.append((None, condition))
-        else:
-            self.parts.append((self.AND, condition))
-        return self
+            return self._append((None, condition))
+        return self._append((self.AND, condition))
 
     def or_(self, condition):
         if not self.parts:
-            self.parts.append((None, condition))
-        else:
-            self.parts.append((self.OR, condition))
-        return self
+            return self._append((None, condition))
+        return self._append((self.OR, condition))
 
     __iand__ = and_
     __iadd__ = and_
     __ior__ = or_
 
+    def as_condition(self):
+        """ Return conditions without the keyword, in parentheses, so they
+        can be combined with other conditions """
+        if not self.parts:
+            return ''
+        return '({})'.format(self.serialize()[len(self.keyword) + 1:])
+
 
 class Group(BaseClause):
     keyword = 'GROUP BY'
@@ -215,12 +234,10 @@ class Order(BaseClause):
         self.parts = list(parts)
 
     def asc(self, term):
-        self.parts.append('+{}'.format(term))
-        return self
+        return self._append('+{}'.format(term))
 
     def desc(self, term):
-        self.parts.append('-{}'.format(term))
-        return self
+        return self._append('-{}'.format(term))
 
     def __iadd__(self, term):
         return self.asc(term)
@@ -243,6 +260,105 @@ class Order(BaseClause):
         return sql
 
 
+def over(func, window, alias=None):
+    """ Return window function call ``func`` over ``window``
+
+    The ``window`` can be a :py:class:`Window` object, or a name of a window
+    defined in the query's ``WINDOW`` clause.
+    """
+    if hasattr(window, 'serialize'):
+        window = '({})'.format(window.serialize())
+    sql = '{} OVER {}'.format(func, window)
+    if alias:
+        sql += ' AS {}'.format(alias)
+    return sql
+
+
+class Window(SQL):
+    ROWS = 'ROWS'
+    RANGE = 'RANGE'
+    GROUPS = 'GROUPS'
+
+    UNBOUNDED_PRECEDING = 'UNBOUNDED PRECEDING'
+    UNBOUNDED_FOLLOWING = 'UNBOUNDED FOLLOWING'
+    CURRENT_ROW = 'CURRENT ROW'
+
+    def __init__(self, partition=None, order=None, frame=None, base=None):
+        if not partition:
+            partition = []
+        elif not is_seq(partition):
+            partition = [partition]
+        self.partition = list(partition)
+        self.order = order
+        self.frame = frame
+        self.base = base
+
+    def __setattr__(self, attr, val):
+        if attr == 'order':
+            val = Statement._get_clause(val, Order)
+        object.__setattr__(self, attr, val)
+
+    def partition_by(self, term):
+        self.partition.append(term)
+        return self
+
+    def rows(self, start, end=None):
+        return self._set_frame(self.ROWS, start, end)
+
+    def range(self, start, end=None):
+        return self._set_frame(self.RANGE, start, end)
+
+    def groups(self, start, end=None):
+        return self._set_frame(self.GROUPS, start, end)
+
+    def _set_frame(self, kind, start, end):
+        if end is None:
+            self.frame = '{} {}'.format(kind, start)
+        else:
+            self.frame = '{} BETWEEN {} AND {}'.format(kind, start, end)
+        return self
+
+    def over(self, func, alias=None):
+        return over(func, self, alias)
+
+    def serialize(self):
+        sql = []
+        if self.base:
+            sql.append(self.base)
+        if self.partition:
+            sql.append('PARTITION BY {}'.format(', '.join(self.partition)))
+        if self.order:
+            sql.append(self.order.serialize())
+        if self.frame:
+            sql.append(self.frame)
+        return ' '.join(sql)
+
+
+class Windows(BaseClause):
+    keyword = 'WINDOW'
+
+    def __init__(self, *windows, **kwargs):
+        self.parts = []
+        for name, window in windows:
+            self.add(name, window)
+        for name in sorted(kwargs):
+            self.add(name, kwargs[name])
+
+    def add(self, name, window):
+        return self._append((name, window))
+
+    def serialize(self):
+        if not self.parts:
+            return ''
+        sql = self.keyword + ' '
+        sql += ', '.join(('{} AS ({})'.format(name, window)
+                          for name, window in self.parts))
+        return sql
+
+    def __bool__(self):
+        return len(self.parts) > 0
+
+
 class Limit(SQL):
     def __init__(self, limit=None, offset=None):
         self.limit = limit
@@ -264,6 +380,60 @@ class Limit(SQL):
         return len(self) > 0
 
 
+class With(BaseClause):
+    keyword = 'WITH'
+    recursive_keyword = 'WITH RECURSIVE'
+
+    MATERIALIZED = 'MATERIALIZED'
+    NOT_MATERIALIZED = 'NOT MATERIALIZED'
+
+    def __init__(self, *ctes, **kwargs):
+        self.recursive = kwargs.pop('recursive', False)
+        self.parts = []
+        for cte in ctes:
+            self.add(*cte)
+        for name in sorted(kwargs):
+            self.add(name, kwargs[name])
+
+    def add(self, name, query, cols=None, materialized=None):
+        """ Add a common table expression
+
+        ``materialized`` can be ``True`` or ``False`` to emit the
+        ``MATERIALIZED`` or ``NOT MATERIALIZED`` hint. By default, the choice
+        is left to the query planner.
+        """
+        return self._append((name, query, cols, materialized))
+
+    @property
+    def names(self):
+        return [p[0] for p in self.parts]
+
+    def _convert_part(self, name, query, cols, materialized):
+        if is_seq(cols):
+            cols = ', '.join(cols)
+        if cols:
+            name = '{}({})'.format(name, cols)
+        if materialized is True:
+            name += ' AS ' + self.MATERIALIZED
+        elif materialized is False:
+            name += ' AS ' + self.NOT_MATERIALIZED
+        else:
+            name += ' AS'
+        query = query.serialize() if hasattr(query, 'serialize') else query
+        return '{} ({})'.format(name, query.rstrip().rstrip(';'))
+
+    def serialize(self):
+        if not self.parts:
+            return ''
+        sql = self.recursive_keyword if self.recursive else self.keyword
+        sql += ' '
+        sql += ', '.join((self._convert_part(*p) for p in self.parts))
+        return sql
+
+    def __bool__(self):
+        return len(self.parts) > 0
+
+
 class Statement(SQL):
     lists = []
     ints = []
@@ -305,6 +475,15 @@ class Statement(SQL):
             return None
         return int(val)
 
+    @property
+    def _with(self):
+        return self._get_clause(self.with_, With)
+
+    def _prefix(self, sql):
+        if self.with_:
+            return '{} {}'.format(self._with, sql)
+        return sql
+
 
 class Select(Statement):
     lists = ('what',)
@@ -315,10 +494,13 @@ class Select(Statement):
         'group': Group,
         'order': Order,
         'limit': int,
+        'with_': With,
+        'windows': Windows,
     }
 
     def __init__(self, what=['*'], sets=None, where=None, group=None,
-                 order=None, limit=None, offset=None, alias=None):
+                 order=None, limit=None, offset=None, alias=None,
+                 with_=None, windows=None):
         self.what = what
         self.sets = sets
         self.where = where
@@ -327,9 +509,11 @@ class Select(Statement):
         self.limit = limit
         self.offset = offset
         self.alias = alias
+        self.with_ = with_
+        self.windows = windows
 
     def serialize(self):
-        sql = 'SELECT '
+        sql = self._prefix('SELECT ')
         what = (s.as_subquery() if hasattr(s, 'as_subquery') else s
                 for s in self._what)
         sql += ', '.join(what)
@@ -339,6 +523,8 @@ class Select(Statement):
             sql += ' {}'.format(self._where)
         if self.group:
             sql += ' {}'.format(self._group)
+        if self.windows:
+            sql += ' {}'.format(self._windows)
         if self.order:
             sql += ' {}'.format(self._order)
         if self.limit:
@@ -353,6 +539,47 @@ class Select(Statement):
             suffix = ''
         return '({}){}'.format(self.serialize().rstrip(';'), suffix)
 
+    def count(self, what='COUNT(*)'):
+        """ Return a query that counts the rows this query would return
+
+        Ordering and limits are dropped. Grouped, ``DISTINCT`` and aggregate
+        queries are wrapped in a subquery. The clauses are shared with this
+        query, so later changes to them are reflected in both.
+        """
+        if self._needs_wrapping:
+            return Select(what, sets=From(self._unordered()),
+                          with_=self.with_)
+        return Select(what, sets=self.sets, where=self.where,
+                      with_=self.with_)
+
+    def exists(self):
+        """ Return a query that selects ``1`` if this query returns any rows
+
+        Ordering is dropped and limit is set to 1. Clauses are shared with
+        this query in the same way as with :py:meth:`count`.
+        """
+        if self._needs_wrapping:
+            return Select('1', sets=From(self._unordered()), limit=1,
+                          with_=self.with_)
+        return Select('1', sets=self.sets, where=self.where, limit=1,
+                      with_=self.with_)
+
+    def _unordered(self):
+        return Select(self.what, sets=self.sets, where=self.where,
+                      group=self.group, windows=self.windows)
+
+    @property
+    def _needs_wrapping(self):
+        if self.group:
+            return True
+        what = self._what
+        if bool(what) and isinstance(what[0], basestring) and \
+                what[0].lstrip().upper().startswith('DISTINCT '):
+            return True
+        # Aggregates without grouping return a single row
+        return any(isinstance(w, basestring) and AGGREGATE_RE.search(w)
+                   for w in what)
+
     @property
     def _what(self):
         return self._get_list(self.what)
@@ -373,25 +600,120 @@ class Select(Statement):
     def _order(self):
         return self._get_clause(self.order, Order)
 
+    @property
+    def _windows(self):
+        return self._get_clause(self.windows, Windows)
+
+    @property
+    def _limit(self):
+        return Limit(self.limit, self.offset)
+
+
+class Compound(Statement):
+    """ Combine several selects using set operators
+
+    Note that SQLite limits the number of members of a compound select to
+    500 by default (``SQLITE_MAX_COMPOUND_SELECT``).
+    """
+
+    ints = ('limit', 'offset')
+    clauses = {
+        'order': Order,
+        'with_': With,
+    }
+
+    UNION = UNION
+    UNION_ALL = UNION_ALL
+    INTERSECT = INTERSECT
+    EXCEPT = EXCEPT
+
+    def __init__(self, *selects, **kwargs):
+        operator = kwargs.pop('operator', self.UNION_ALL)
+        self.order = kwargs.pop('order', None)
+        self.limit = kwargs.pop('limit', None)
+        self.offset = kwargs.pop('offset', None)
+        self.alias = kwargs.pop('alias', None)
+        self.with_ = kwargs.pop('with_', None)
+        self.parts = []
+        for select in selects:
+            self.add(select, operator)
+
+    def add(self, select, operator=UNION_ALL):
+        self.parts.append((operator if self.parts else None, select))
+        return self
+
+    def union(self, select):
+        return self.add(select, self.UNION)
+
+    def union_all(self, select):
+        return self.add(select, self.UNION_ALL)
+
+    def intersect(self, select):
+        return self.add(select, self.INTERSECT)
+
+    def except_(self, select):
+        return self.add(select, self.EXCEPT)
+
+    @staticmethod
+    def _serialize_branch(select):
+        if not hasattr(select, 'serialize'):
+            return select.rstrip().rstrip(';')
+        # Compound members may not have their own ORDER BY, LIMIT or WITH
+        # clauses, so such members are evaluated as subqueries. Nested
+        # compounds are also wrapped to preserve their grouping.
+        if isinstance(select, Compound) or getattr(select, 'order', None) \
+                or getattr(select, 'limit', None) \
+                or getattr(select, 'with_', None):
+            return 'SELECT * FROM ' + select.as_subquery(alias='')
+        return select.serialize().rstrip(';')
+
+    def serialize(self):
+        sql = []
+        for operator, select in self.parts:
+            if operator:
+                sql.append(operator)
+            sql.append(self._serialize_branch(select))
+        if self.order:
+            sql.append(self._order.serialize())
+        if self.limit:
+            sql.append(self._limit.serialize())
+        return self._prefix(' '.join(sql)) + ';'
+
+    def as_subquery(self, alias=None):
+        alias = alias or self.alias
+        if alias:
+            suffix = ' AS {}'.format(alias)
+        else:
+            suffix = ''
+        return '({}){}'.format(self.serialize().rstrip(';'), suffix)
+
+    def __len__(self):
+        return len(self.parts)
+
+    @property
+    def _order(self):
+        return self._get_clause(self.order, Order)
+
     @property
     def _limit(self):
         return Limit(self.limit, self.offset)
 
 
 class Update(Statement):
-    clauses = {'where': Where}
+    clauses = {'where': Where, 'with_': With}
 
-    def __init__(self, table, where=None, **kwargs):
+    def __init__(self, table, where=None, with_=None, **kwargs):
         self.table = table
         self.set_args = kwargs
         self.where = where
+        self.with_ = with_
 
     @property
     def _where(self):
         return self._get_clause(self.where, Where)
 
     def serialize(self):
-        sql = 'UPDATE {} SET '.format(self.table)
+        sql = self._prefix('UPDATE {} SET '.format(self.table))
         sql += ', '.join(('{} = {}'.format(col, p)
                           for col, p in self.set_args.items()))
         if self.where:
@@ -400,14 +722,15 @@ class Update(Statement):
 
 
 class Delete(Statement):
-    clauses = {'where': Where}
+    clauses = {'where': Where, 'with_': With}
 
-    def __init__(self, table, where=None):
+    def __init__(self, table, where=None, with_=None):
         self.table = table
         self.where = where
+        self.with_ = with_
 
     def serialize(self):
-        sql = 'DELETE FROM {}'.format(self.table)
+        sql = self._prefix('DELETE FROM {}'.format(self.table))
         if self.where:
             sql += ' {}'.format(self._where)
         return sql + ';'
@@ -419,16 +742,18 @@ class Delete(Statement):
 
 class Insert(Statement):
     keyword = 'INSERT INTO'
+    clauses = {'with_': With}
 
-    def __init__(self, table, vals=None, cols=None):
+    def __init__(self, table, vals=None, cols=None, with_=None):
         self.table = table
         self.vals = vals
         self.cols = cols
+        self.with_ = with_
         if not any([vals, cols]):
             raise ValueError('Either vals or cols must be specified')
 
     def serialize(self):
-        sql = '{} {}'.format(self.keyword, self.table)
+        sql = self._prefix('{} {}'.format(self.keyword, self.table))
         if self.cols:
             sql += ' {}'.format(self._cols)
         sql += ' VALUES {}'.format(self._vals)
@@ -0,0 +1,181 @@
+"""
+columnar.py: Fetching select results into typed column buffers
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import re
+import math
+import array
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .merge import column_name, unique_names, unqualified
+
+try:
+    integer_types = (int, long)
+except NameError:
+    integer_types = (int,)
+
+try:
+    # 'q' is not available before Python 3.3, where 'l' is the widest type
+    INT = array.array('q').typecode
+except ValueError:
+    INT = 'l'
+
+FLOAT = 'd'
+OBJECT = None
+
+FLOAT_CODES = ('f', 'd')
+
+IDENT_RE = re.compile(r'^\w+$')
+
+
+def infer_type(val):
+    if isinstance(val, bool):
+        return OBJECT
+    if isinstance(val, integer_types):
+        return INT
+    if isinstance(val, float):
+        return FLOAT
+    return OBJECT
+
+
+def select_names(stmt, cursor):
+    """ Return result column names for ``stmt``
+
+    Names are derived from the select list, using aliases where present and
+    dropping table names from ``table.column`` items. Cursor description is
+    used for other expressions, ``*`` and subqueries. Names that occur more
+    than once are suffixed with the column position.
+    """
+    names = [d[0] for d in cursor.description]
+    what = stmt._what if hasattr(stmt, '_what') else []
+    if len(what) == len(names):
+        for i, expr in enumerate(what):
+            if not hasattr(expr, 'strip'):
+                continue
+            name = unqualified(column_name(expr))
+            if IDENT_RE.match(name):
+                names[i] = name
+    return unique_names(names)
+
+
+class Column(object):
+    """ Growable typed buffer for values of a single column
+
+    Numeric values are stored in an ``array.array``, so memory use is close
+    to the raw size of the data. ``NULL`` values are stored as ``NaN`` in
+    float columns. Columns with inferred integer type are widened to floats
+    when a float or ``NULL`` value is encountered. Other values are kept in a
+    list, and inferred numeric columns that encounter values of another type,
+    such as text, are converted to a list.
+    """
+
+    def __init__(self, name, typecode=OBJECT):
+        self.name = name
+        self.typecode = typecode
+        self.inferred = typecode is OBJECT
+        self.data = None
+        self.nulls = 0
+
+    def _allocate(self, values):
+        if self.inferred:
+            for val in values:
+                if val is not None:
+                    self.typecode = infer_type(val)
+                    break
+            else:
+                # Only NULLs so far, so the type choice is deferred
+                return
+        self.data = [] if self.typecode is OBJECT else \
+            array.array(self.typecode)
+
+    def extend(self, values):
+        if self.data is None:
+            self._allocate(values)
+            if self.data is None:
+                self.nulls += len(values)
+                return
+            values = [None] * self.nulls + list(values)
+            self.nulls = 0
+        stored = values
+        if self.typecode in FLOAT_CODES:
+            stored = [float('nan') if v is None else v for v in values]
+        size = len(self.data)
+        try:
+            self.data.extend(stored)
+        except TypeError:
+            # array.array may have been partially extended
+            del self.data[size:]
+            if not self.inferred:
+                raise ValueError("Column '{}' contains values that can't be "
+                                 "stored as '{}'".format(self.name,
+                                                         self.typecode))
+            self._widen(values)
+            self.extend(values)
+
+    def _widen(self, values):
+        """ Change the inferred type so that ``values`` can be stored """
+        numeric = all(v is None or infer_type(v) in (INT, FLOAT)
+                      for v in values)
+        if self.typecode == INT and numeric:
+            self.typecode = FLOAT
+            self.data = array.array(FLOAT, self.data)
+            return
+        # SQLite columns can hold values of any type, so the column falls
+        # back to a list, where NaN stored for NULL becomes None again
+        data = self.data
+        if self.typecode in FLOAT_CODES:
+            data = [None if math.isnan(v) else v for v in data]
+        self.typecode = OBJECT
+        self.data = list(data)
+
+    def result(self, use_numpy):
+        data = self.data
+        if data is None:
+            data = [None] * self.nulls
+        if not use_numpy:
+            return data
+        if isinstance(data, array.array):
+            # Shares memory with the array, which is kept alive by the result
+            return numpy.frombuffer(data, dtype=data.typecode)
+        result = numpy.empty(len(data), dtype=object)
+        result[:] = data
+        return result
+
+
+def fetch_columns(cursor, stmt, params=(), types=None, batch_size=10000,
+                  use_numpy=None):
+    """ Execute ``stmt`` and return results as a dict of column arrays
+
+    Rows are fetched in batches of ``batch_size`` and distributed into typed
+    column buffers, so full result set is never held as tuples. ``types``
+    maps column names to ``array`` module typecodes; types of other columns
+    are inferred from the first non-NULL value. Results are NumPy arrays if
+    NumPy is installed (``use_numpy`` can override this), or ``array.array``
+    and ``list`` objects otherwise.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise RuntimeError('NumPy is not installed')
+    types = types or {}
+    cursor.execute(str(stmt), params)
+    names = select_names(stmt, cursor)
+    columns = [Column(n, types.get(n, OBJECT)) for n in names]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for col, values in zip(columns, zip(*rows)):
+            col.extend(values)
+    return OrderedDict((c.name, c.result(use_numpy)) for c in columns)
@@ -0,0 +1,66 @@
+"""
+compat.py: Python 2 and 3 compatibility helpers
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import io
+import csv
+import time
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+PY2 = text_type is not str
+
+# Types of BLOB values returned by sqlite3 (``buffer`` on Python 2)
+try:
+    binary_types = (bytes, bytearray, buffer)
+except NameError:
+    binary_types = (bytes, bytearray)
+
+# Monotonic high resolution clock, not available before Python 3.3
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def _encode(val):
+    if isinstance(val, text_type):
+        return val.encode('utf-8')
+    return val
+
+
+class TextCSVWriter(object):
+    """ CSV writer for text streams on Python 2
+
+    The Python 2 csv module only handles byte strings, so rows are written to
+    a buffer as UTF-8 and decoded before they are written to ``fd``.
+    """
+
+    def __init__(self, fd, dialect='excel'):
+        self.fd = fd
+        self.buffer = io.BytesIO()
+        self.writer = csv.writer(self.buffer, dialect=dialect)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writer.writerow([_encode(v) for v in row])
+        self.fd.write(self.buffer.getvalue().decode('utf-8'))
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def writerow(self, row):
+        self.writerows([row])
+
+
+def csv_writer(fd, dialect='excel'):
+    """ Return a csv writer that writes text to ``fd`` """
+    if PY2:
+        return TextCSVWriter(fd, dialect)
+    return csv.writer(fd, dialect=dialect)
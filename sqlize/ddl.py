@@ -0,0 +1,210 @@
+"""
+ddl.py: Builders for schema definition statements
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+from .builder import SQL, Statement, Select, Where
+
+
+class CreateTable(Statement):
+    lists = ('cols', 'constraints')
+
+    def __init__(self, name, cols, constraints=None, if_not_exists=True,
+                 temporary=False, without_rowid=False, strict=False):
+        self.name = name
+        self.cols = cols
+        self.constraints = constraints
+        self.if_not_exists = if_not_exists
+        self.temporary = temporary
+        self.without_rowid = without_rowid
+        self.strict = strict
+
+    def serialize(self):
+        sql = 'CREATE TEMPORARY TABLE ' if self.temporary else 'CREATE TABLE '
+        if self.if_not_exists:
+            sql += 'IF NOT EXISTS '
+        sql += '{} ({})'.format(self.name,
+                                ', '.join(self.cols + self.constraints))
+        options = []
+        if self.without_rowid:
+            options.append('WITHOUT ROWID')
+        if self.strict:
+            options.append('STRICT')
+        if options:
+            sql += ' ' + ', '.join(options)
+        return sql + ';'
+
+
+class CreateIndex(Statement):
+    lists = ('cols',)
+    clauses = {'where': Where}
+
+    def __init__(self, name, table, cols, unique=False, where=None,
+                 if_not_exists=True):
+        self.name = name
+        self.table = table
+        self.cols = cols
+        self.unique = unique
+        self.where = where
+        self.if_not_exists = if_not_exists
+
+    def serialize(self):
+        sql = 'CREATE UNIQUE INDEX ' if self.unique else 'CREATE INDEX '
+        if self.if_not_exists:
+            sql += 'IF NOT EXISTS '
+        sql += '{} ON {} ({})'.format(self.name, self.table,
+                                      ', '.join(self.cols))
+        if self.where:
+            sql += ' {}'.format(self._where)
+        return sql + ';'
+
+    @property
+    def _where(self):
+        return self._get_clause(self.where, Where)
+
+
+class Drop(Statement):
+    """ Statement dropping a schema object of the ``keyword`` type """
+    keyword = None
+
+    def __init__(self, name, if_exists=True):
+        self.name = name
+        self.if_exists = if_exists
+
+    def serialize(self):
+        sql = 'DROP {} '.format(self.keyword)
+        if self.if_exists:
+            sql += 'IF EXISTS '
+        return sql + self.name + ';'
+
+
+class DropIndex(Drop):
+    keyword = 'INDEX'
+
+
+class DropTable(Drop):
+    keyword = 'TABLE'
+
+
+class CreateTrigger(Statement):
+    lists = ('body',)
+
+    def __init__(self, name, table, event, body, timing='AFTER',
+                 if_not_exists=True):
+        self.name = name
+        self.table = table
+        self.event = event
+        self.body = body
+        self.timing = timing
+        self.if_not_exists = if_not_exists
+
+    def serialize(self):
+        sql = 'CREATE TRIGGER '
+        if self.if_not_exists:
+            sql += 'IF NOT EXISTS '
+        return sql + '{} {} {} ON {} BEGIN {} END;'.format(
+            self.name, self.timing, self.event, self.table,
+            ' '.join(str(s) for s in self.body))
+
+
+class DropTrigger(Drop):
+    keyword = 'TRIGGER'
+
+
+class Analyze(Statement):
+
+    def __init__(self, target=None):
+        self.target = target
+
+    def serialize(self):
+        if not self.target:
+            return 'ANALYZE;'
+        return 'ANALYZE {};'.format(self.target)
+
+
+SYNC_TRIGGERS = ('ai', 'ad', 'au')
+
+
+def sync_trigger(table, suffix, source, event, body):
+    """ Return trigger ``<table>_<suffix>`` that updates ``table`` after
+    ``event`` on ``source`` """
+    return CreateTrigger('{}_{}'.format(table, suffix), source, event, body)
+
+
+def drop_synced(table):
+    """ Return a script that drops ``table`` and the insert, delete and
+    update triggers created for it by :py:func:`sync_trigger` """
+    sql = [DropTrigger('{}_{}'.format(table, s)) for s in SYNC_TRIGGERS]
+    sql.append(DropTable(table))
+    return '\n'.join(str(s) for s in sql)
+
+
+class Schema(SQL):
+    """ Declared set of tables and indexes
+
+    The schema can be compared against the ``sqlite_master`` table of an
+    existing database to find out which of the declared objects are missing.
+    Objects are matched by name only, so changed definitions are not
+    detected.
+    """
+
+    def __init__(self, *statements):
+        self.tables = []
+        self.indexes = []
+        for stmt in statements:
+            self.add(stmt)
+
+    def add(self, stmt):
+        if isinstance(stmt, CreateTable):
+            self.tables.append(stmt)
+        elif isinstance(stmt, CreateIndex):
+            self.indexes.append(stmt)
+        else:
+            raise TypeError('Only CreateTable and CreateIndex statements can '
+                            'be added to a schema')
+        return self
+
+    @staticmethod
+    def existing(conn, kind):
+        query = Select('name', sets='sqlite_master', where='type = ?')
+        return set(row[0] for row in conn.execute(str(query), (kind,)))
+
+    def missing_tables(self, conn):
+        existing = self.existing(conn, 'table')
+        return [t for t in self.tables if t.name not in existing]
+
+    def missing_indexes(self, conn):
+        existing = self.existing(conn, 'index')
+        return [i for i in self.indexes if i.name not in existing]
+
+    def missing(self, conn):
+        """ Return statements for all missing tables followed by indexes """
+        return self.missing_tables(conn) + self.missing_indexes(conn)
+
+    def apply(self, conn, analyze=True):
+        """ Create missing objects and return the executed statements
+
+        When ``analyze`` is true and any indexes were created, tables that
+        received new indexes are analyzed so the query planner can use them.
+        """
+        missing = self.missing(conn)
+        for stmt in missing:
+            conn.execute(str(stmt))
+        if analyze:
+            tables = []
+            for stmt in missing:
+                if isinstance(stmt, CreateIndex) and stmt.table not in tables:
+                    tables.append(stmt.table)
+            for table in tables:
+                stmt = Analyze(table)
+                conn.execute(str(stmt))
+                missing.append(stmt)
+        return missing
+
+    def serialize(self):
+        return '\n'.join(str(s) for s in self.tables + self.indexes)
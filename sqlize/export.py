@@ -0,0 +1,236 @@
+"""
+export.py: Streaming select results to CSV and NDJSON files
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import io
+import copy
+import gzip
+import json
+import base64
+
+from .builder import Where
+from .merge import find_column
+from .compat import binary_types, csv_writer, timer
+
+
+BUFFER_SIZE = 256 * 1024
+
+
+class ExportStats(object):
+    def __init__(self, rows, elapsed):
+        self.rows = rows
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_sec(self):
+        if not self.elapsed:
+            return 0.0
+        return self.rows / self.elapsed
+
+    def __repr__(self):
+        return '<ExportStats {} rows in {:.3f}s>'.format(self.rows,
+                                                          self.elapsed)
+
+
+class Exporter(object):
+    """ Stream rows of a select into a file
+
+    Rows are fetched ``batch_size`` at a time, so memory use does not depend
+    on the size of the result set.
+
+    In keyset mode, enabled by passing a ``keyset`` column, the select is
+    executed repeatedly in chunks of ``chunk_size`` rows ordered by that
+    column, each chunk continuing after the last key seen. No read
+    transaction is held open between chunks. The key column must be unique
+    and included in the selected columns under its own name. Limit and
+    offset of the select apply to the export as a whole. A condition on the
+    key is appended to the ``where`` clause, so positional parameters may
+    only be used in the select list and ``where``.
+    """
+
+    def __init__(self, cursor, stmt, params=(), batch_size=1000,
+                 keyset=None, chunk_size=10000):
+        self.cursor = cursor
+        self.stmt = stmt
+        self.params = params
+        self.batch_size = batch_size
+        self.keyset = keyset
+        self.chunk_size = chunk_size
+        self.names = None
+
+    def _execute(self, sql, params):
+        self.cursor.execute(sql, params)
+        self.names = [d[0] for d in self.cursor.description]
+
+    def _fetch(self):
+        while True:
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            yield rows
+
+    def _keyset_query(self):
+        stmt = self.stmt
+        if stmt.order and \
+                [t.lstrip('+') for t in stmt._order.parts] != [self.keyset]:
+            raise ValueError('Keyset export requires ordering by the key '
+                             'column')
+        named = hasattr(self.params, 'keys')
+        first = copy.copy(stmt)
+        first.order = self.keyset
+        first.limit = self.chunk_size
+        after = copy.copy(first)
+        after.offset = None
+        conditions = []
+        if stmt.where:
+            conditions.append(stmt._where.as_condition())
+        conditions.append('{} > {}'.format(
+            self.keyset, ':_keyset_last' if named else '?'))
+        after.where = Where(*conditions)
+        return str(first), str(after), named
+
+    def batches(self):
+        """ Return an iterator over batches of rows
+
+        The first query is executed right away, so errors in the query, and
+        a keyset column that is not among the selected columns, are reported
+        before any rows are written.
+        """
+        if not self.keyset:
+            self._execute(str(self.stmt), self.params)
+            return self._fetch()
+        first, after, named = self._keyset_query()
+        self._execute(first, self.params)
+        key_idx = find_column(self.names, self.keyset)
+        return self._keyset_batches(after, named, key_idx)
+
+    def _keyset_batches(self, after, named, key_idx):
+        # Offset only applies to the first chunk, and the limit of the
+        # original select to the total number of exported rows.
+        remaining = self.stmt.limit
+        while True:
+            count = 0
+            last = None
+            for rows in self._fetch():
+                count += len(rows)
+                last = rows[-1]
+                if remaining is not None:
+                    rows = rows[:remaining]
+                    remaining -= len(rows)
+                if rows:
+                    yield rows
+                if remaining == 0:
+                    return
+            if count < self.chunk_size:
+                return
+            if named:
+                params = dict(self.params, _keyset_last=last[key_idx])
+            else:
+                params = tuple(self.params) + (last[key_idx],)
+            self._execute(after, params)
+
+    def write(self, fd, batches=None):
+        raise NotImplementedError('Must be implemented by exporter')
+
+    def export(self, dest, compress=None):
+        """ Write rows to ``dest`` and return :py:class:`ExportStats`
+
+        ``dest`` is either a path or a text file-like object. With
+        ``compress``, output is gzipped, and file-like ``dest`` must be
+        opened in binary mode. Paths ending in ``.gz`` are compressed by
+        default.
+        """
+        start = timer()
+        batches = self.batches()
+        if hasattr(dest, 'write'):
+            if compress:
+                raw = gzip.GzipFile(fileobj=dest, mode='wb')
+                fd = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+                try:
+                    rows = self.write(fd, batches)
+                finally:
+                    fd.flush()
+                    fd.detach()
+                    raw.close()
+            else:
+                rows = self.write(dest, batches)
+        else:
+            if compress is None:
+                compress = dest.endswith('.gz')
+            if compress:
+                fd = io.TextIOWrapper(gzip.open(dest, 'wb'), encoding='utf-8',
+                                      newline='')
+            else:
+                fd = io.open(dest, 'w', buffering=BUFFER_SIZE,
+                             encoding='utf-8', newline='')
+            with fd:
+                rows = self.write(fd, batches)
+        return ExportStats(rows, timer() - start)
+
+
+class CSVExporter(Exporter):
+
+    def __init__(self, *args, **kwargs):
+        self.header = kwargs.pop('header', True)
+        self.dialect = kwargs.pop('dialect', 'excel')
+        super(CSVExporter, self).__init__(*args, **kwargs)
+
+    def write(self, fd, batches=None):
+        writer = csv_writer(fd, self.dialect)
+        if batches is None:
+            batches = self.batches()
+        count = 0
+        for rows in batches:
+            if self.header and not count:
+                writer.writerow(self.names)
+            writer.writerows(rows)
+            count += len(rows)
+        if self.header and not count and self.names:
+            writer.writerow(self.names)
+        return count
+
+
+def json_default(val):
+    if isinstance(val, binary_types):
+        return base64.b64encode(bytes(val)).decode('ascii')
+    raise TypeError('{!r} is not JSON serializable'.format(val))
+
+
+class NDJSONExporter(Exporter):
+
+    def write(self, fd, batches=None):
+        encoder = json.JSONEncoder(separators=(',', ':'),
+                                   default=json_default)
+        if batches is None:
+            batches = self.batches()
+        count = 0
+        for rows in batches:
+            names = self.names
+            # Joined as text, as the encoder returns bytes on Python 2
+            fd.write(u''.join(encoder.encode(dict(zip(names, row))) + u'\n'
+                              for row in rows))
+            count += len(rows)
+        return count
+
+
+def export_csv(cursor, stmt, dest, params=(), compress=None, **kwargs):
+    """ Export results of ``stmt`` to ``dest`` as CSV
+
+    Keyword arguments are passed to :py:class:`CSVExporter`.
+    """
+    return CSVExporter(cursor, stmt, params, **kwargs).export(dest, compress)
+
+
+def export_ndjson(cursor, stmt, dest, params=(), compress=None, **kwargs):
+    """ Export results of ``stmt`` to ``dest`` as newline-delimited JSON
+
+    Keyword arguments are passed to :py:class:`NDJSONExporter`.
+    """
+    return NDJSONExporter(cursor, stmt, params, **kwargs).export(dest,
+                                                                  compress)
@@ -0,0 +1,376 @@
+"""
+expr.py: Structured predicates and WHERE clause optimization
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import re
+
+from .builder import Where, Statement, is_seq, sqlin
+from .registry import placeholders
+
+
+WORD_RE = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|[()]|\w+")
+EQUALITY_RE = re.compile(
+    r"^([A-Za-z_][\w.]*)\s*==?\s*(\?\d*|[:@$]\w+|-?\d+(?:\.\d+)?|"
+    r"'(?:[^']|'')*')$")
+
+
+def _parenthesized(sql):
+    """ Return ``True`` if ``sql`` is enclosed in a pair of parentheses """
+    if not (sql.startswith('(') and sql.endswith(')')):
+        return False
+    depth = 0
+    for i, c in enumerate(sql):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if not depth:
+                return i == len(sql) - 1
+    return False
+
+
+def _top_level_bool(sql):
+    """ Return ``True`` if ``sql`` has ``AND`` or ``OR`` outside of
+    parentheses, not counting the ``AND`` of ``BETWEEN`` """
+    depth = 0
+    between = False
+    for word in WORD_RE.findall(sql):
+        if word == '(':
+            depth += 1
+        elif word == ')':
+            depth -= 1
+        elif depth:
+            continue
+        elif word.upper() == 'BETWEEN':
+            between = True
+        elif word.upper() == 'AND' and between:
+            between = False
+        elif word.upper() in ('AND', 'OR'):
+            return True
+    return False
+
+
+def _operand(val):
+    if isinstance(val, Col):
+        return val.name
+    return str(val)
+
+
+class Predicate(object):
+    """ Base class for predicates
+
+    Predicates are converted to SQL by coercing them to ``str``, and can be
+    used anywhere a condition string is accepted. They can be combined with
+    ``&``, ``|`` and ``~``, which also accept plain strings.
+    """
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __rand__(self, other):
+        return And(other, self)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __ror__(self, other):
+        return Or(other, self)
+
+    def __invert__(self):
+        return Not(self)
+
+    @property
+    def key(self):
+        """ Text used to detect duplicate predicates """
+        return str(self)
+
+    @property
+    def positional(self):
+        """ Number of positional parameters used by the predicate """
+        return placeholders(str(self))[0]
+
+
+class Raw(Predicate):
+    """ Predicate given as a SQL string
+
+    The string is treated as a single predicate, and is parenthesized when
+    combined with other predicates if it contains ``AND`` or ``OR`` outside
+    of parentheses.
+    """
+
+    def __init__(self, sql):
+        self.sql = sql.strip()
+
+    @property
+    def key(self):
+        return ' '.join(self.sql.split())
+
+    def __str__(self):
+        if _top_level_bool(self.sql):
+            return '({})'.format(self.sql)
+        return self.sql
+
+
+class Comparison(Predicate):
+    def __init__(self, col, op, val):
+        self.col = col
+        self.op = op
+        self.val = val
+
+    def __str__(self):
+        return '{} {} {}'.format(self.col, self.op, self.val)
+
+
+class In(Predicate):
+    def __init__(self, col, values):
+        self.col = col
+        self.values = list(values)
+
+    def __str__(self):
+        if all(v == '?' for v in self.values):
+            return sqlin(self.col, len(self.values))
+        return '{} IN ({})'.format(self.col, ', '.join(self.values))
+
+
+class Not(Predicate):
+    def __init__(self, term):
+        self.term = predicate(term)
+
+    def __str__(self):
+        term = str(self.term)
+        if not _parenthesized(term):
+            term = '({})'.format(term)
+        return 'NOT {}'.format(term)
+
+
+class Bool(Predicate):
+    connector = None
+
+    def __init__(self, *terms):
+        self.terms = [predicate(t) for t in terms]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __str__(self):
+        sql = ' {} '.format(self.connector).join(str(t) for t in self.terms)
+        if len(self.terms) > 1:
+            return '({})'.format(sql)
+        return sql
+
+
+class And(Bool):
+    connector = Where.AND
+
+
+class Or(Bool):
+    connector = Where.OR
+
+
+def predicate(term):
+    """ Return ``term`` as a :py:class:`Predicate` """
+    if isinstance(term, Predicate):
+        return term
+    if isinstance(term, Where):
+        return parse(term)
+    if hasattr(term, 'serialize'):
+        term = term.serialize()
+    term = str(term).strip()
+    match = EQUALITY_RE.match(term)
+    if match:
+        return Comparison(match.group(1), '=', match.group(2))
+    return Raw(term)
+
+
+class Col(object):
+    """ Column whose comparison operators return predicates
+
+    The right-hand side is rendered as is, so it is usually a placeholder.
+    Columns on the right-hand side are rendered by name, and comparing to
+    ``None`` produces ``IS NULL`` and ``IS NOT NULL`` tests::
+
+        >>> str(Col('foo') == '?')
+        'foo = ?'
+        >>> str(Col('foo') != None)
+        'foo IS NOT NULL'
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _compare(self, op, val):
+        return Comparison(self.name, op, _operand(val))
+
+    def __eq__(self, val):
+        if val is None:
+            return self.is_null()
+        return self._compare('=', val)
+
+    def __ne__(self, val):
+        if val is None:
+            return self.is_not_null()
+        return self._compare('!=', val)
+
+    def __lt__(self, val):
+        return self._compare('<', val)
+
+    def __le__(self, val):
+        return self._compare('<=', val)
+
+    def __gt__(self, val):
+        return self._compare('>', val)
+
+    def __ge__(self, val):
+        return self._compare('>=', val)
+
+    __hash__ = object.__hash__
+
+    def in_(self, values):
+        """ Return ``IN`` test for a sequence of values, or for the given
+        number of positional placeholders """
+        if not is_seq(values):
+            values = ['?'] * values
+        return In(self.name, [_operand(v) for v in values])
+
+    def is_null(self):
+        return Comparison(self.name, 'IS', 'NULL')
+
+    def is_not_null(self):
+        return Comparison(self.name, 'IS NOT', 'NULL')
+
+    def like(self, pattern='?'):
+        return self._compare('LIKE', pattern)
+
+    def between(self, low='?', high='?'):
+        return Comparison(self.name, 'BETWEEN', '{} AND {}'.format(
+            _operand(low), _operand(high)))
+
+    def __str__(self):
+        return self.name
+
+
+class Columns(object):
+    """ Factory of :py:class:`Col` objects, optionally qualified by a table
+    name """
+
+    def __init__(self, table=None):
+        self._table = table
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if self._table:
+            name = '{}.{}'.format(self._table, name)
+        return Col(name)
+
+
+def parse(where):
+    """ Return a predicate equivalent to the ``where`` clause
+
+    ``AND`` binds tighter than ``OR``, as it does in SQL, so the parts are
+    grouped into a disjunction of conjunctions.
+    """
+    where = Statement._get_clause(where, Where)
+    groups = []
+    for connector, part in where.parts:
+        if not groups or (connector or '').upper() == Where.OR:
+            groups.append([])
+        groups[-1].append(part)
+    return Or(*[And(*g) for g in groups])
+
+
+def _equality(term):
+    """ Return ``(column, values)`` if ``term`` tests a column for equality
+    with one of the values """
+    if isinstance(term, In):
+        return term.col, term.values
+    if isinstance(term, Comparison) and term.op == '=':
+        return term.col, [term.val]
+    return None, None
+
+
+def _merge_equalities(terms):
+    # Positional parameters are bound in the order they appear, so a term is
+    # merged into an earlier one only if that does not move its parameters
+    # before positional parameters of other terms.
+    result = []
+    merged = {}
+    groups = {}
+    barrier = 0
+    for term in terms:
+        col, values = _equality(term)
+        idx = groups.get(col)
+        if idx is not None and (not term.positional or barrier <= idx):
+            merged[idx] = merged[idx] + values
+            result[idx] = In(col, merged[idx])
+            continue
+        if col is not None:
+            groups[col] = len(result)
+            merged[len(result)] = values
+        if term.positional:
+            barrier = len(result)
+        result.append(term)
+    return result
+
+
+def simplify(term):
+    """ Return a simplified version of a predicate
+
+    Nested ``AND`` and ``OR`` predicates are flattened and duplicates are
+    removed. Equality tests of the same column combined with ``OR`` are
+    merged into an ``IN`` test. Duplicates that use positional parameters are
+    kept, so the parameters of the original clause still apply.
+    """
+    term = predicate(term)
+    if isinstance(term, Not):
+        return Not(simplify(term.term))
+    if not isinstance(term, Bool):
+        return term
+    cls = type(term)
+    terms = []
+    seen = set()
+    for t in term.terms:
+        t = simplify(t)
+        for t in (t.terms if isinstance(t, cls) else [t]):
+            if t.key in seen and not t.positional:
+                continue
+            seen.add(t.key)
+            terms.append(t)
+    if cls is Or:
+        terms = _merge_equalities(terms)
+    if len(terms) == 1:
+        return terms[0]
+    return cls(*terms)
+
+
+def optimize(where):
+    """ Return an optimized copy of the ``where`` clause
+
+    The clause is parsed with :py:func:`parse` and simplified with
+    :py:func:`simplify`. Plain string parts of the form ``column = value``
+    are treated as comparisons. Clauses with string parts that contain
+    ``AND`` or ``OR`` outside of parentheses are returned unchanged, since
+    their meaning depends on the parts around them.
+    """
+    where = Statement._get_clause(where, Where)
+    for _, part in where.parts:
+        if not isinstance(part, Predicate) and _top_level_bool(str(part)):
+            unchanged = Where()
+            unchanged.parts = list(where.parts)
+            return unchanged
+    term = simplify(parse(where))
+    if isinstance(term, Or):
+        return Where(*term.terms, use_or=True)
+    if isinstance(term, And):
+        return Where(*term.terms)
+    return Where(term)
@@ -0,0 +1,147 @@
+"""
+fts.py: Helpers for SQLite FTS5 full-text search
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+from .builder import SQL, Select, From, Insert, is_seq
+from .ddl import sync_trigger, drop_synced
+
+
+def literal(val):
+    """ Return ``val`` as a SQL string literal """
+    return "'{}'".format(str(val).replace("'", "''"))
+
+
+def match(table, param='?'):
+    return '{} MATCH {}'.format(table, param)
+
+
+def bm25(table, *weights):
+    """ Return ``bm25()`` rank expression for ``table``
+
+    Lower values are better matches, so ascending order should be used.
+    """
+    args = [table] + [str(w) for w in weights]
+    return 'bm25({})'.format(', '.join(args))
+
+
+def snippet(table, col=-1, start='<b>', end='</b>', ellipsis='...',
+            tokens=10, alias=None):
+    sql = 'snippet({}, {}, {}, {}, {}, {})'.format(
+        table, col, literal(start), literal(end), literal(ellipsis), tokens)
+    if alias:
+        sql += ' AS {}'.format(alias)
+    return sql
+
+
+def highlight(table, col, start='<b>', end='</b>', alias=None):
+    sql = 'highlight({}, {}, {}, {})'.format(
+        table, col, literal(start), literal(end))
+    if alias:
+        sql += ' AS {}'.format(alias)
+    return sql
+
+
+class FTSTable(SQL):
+    """ External-content FTS5 index over columns of an existing table
+
+    Serializes to a script that creates the virtual table and the triggers
+    that keep it in sync with the content table. The script is meant to be
+    run using ``sqlite3.Connection.executescript()``. Use :py:meth:`rebuild`
+    to populate an index for a table that already has data.
+    """
+
+    def __init__(self, content, cols, name=None, content_rowid='rowid',
+                 tokenize=None, prefix=None):
+        self.content = content
+        self.cols = list(cols) if is_seq(cols) else [cols]
+        self.name = name or '{}_fts'.format(content)
+        self.content_rowid = content_rowid
+        self.tokenize = tokenize
+        self.prefix = prefix
+
+    def create(self):
+        args = list(self.cols)
+        args.append('content={}'.format(literal(self.content)))
+        if self.content_rowid != 'rowid':
+            args.append('content_rowid={}'.format(
+                literal(self.content_rowid)))
+        if self.tokenize:
+            args.append('tokenize={}'.format(literal(self.tokenize)))
+        if self.prefix:
+            prefix = self.prefix
+            if is_seq(prefix):
+                prefix = ' '.join(str(p) for p in prefix)
+            args.append('prefix={}'.format(literal(prefix)))
+        return 'CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5({});'.format(
+            self.name, ', '.join(args))
+
+    def _insert(self, ref):
+        return Insert(self.name, cols=['rowid'] + self.cols,
+                      vals=['{}.{}'.format(ref, c)
+                            for c in [self.content_rowid] + self.cols])
+
+    def _delete(self):
+        return Insert(self.name, cols=[self.name, 'rowid'] + self.cols,
+                      vals=["'delete'"] + ['old.{}'.format(c) for c in
+                                           [self.content_rowid] + self.cols])
+
+    def triggers(self):
+        watched = list(self.cols)
+        if self.content_rowid != 'rowid':
+            watched.insert(0, self.content_rowid)
+        update = 'UPDATE OF {}'.format(', '.join(watched))
+        return [str(sync_trigger(self.name, suffix, self.content, event, body))
+                for suffix, event, body in (
+                    ('ai', 'INSERT', [self._insert('new')]),
+                    ('ad', 'DELETE', [self._delete()]),
+                    ('au', update, [self._delete(), self._insert('new')]),
+                )]
+
+    def drop(self):
+        return drop_synced(self.name)
+
+    def rebuild(self):
+        return "INSERT INTO {0}({0}) VALUES ('rebuild');".format(self.name)
+
+    def optimize(self):
+        return "INSERT INTO {0}({0}) VALUES ('optimize');".format(self.name)
+
+    def match(self, param='?'):
+        return match(self.name, param)
+
+    def bm25(self, *weights):
+        return bm25(self.name, *weights)
+
+    def snippet(self, col=-1, **kwargs):
+        return snippet(self.name, col, **kwargs)
+
+    def highlight(self, col, **kwargs):
+        return highlight(self.name, col, **kwargs)
+
+    def search(self, what=None, param='?', rank=True, **kwargs):
+        """ Return a select of content table rows matching ``param``
+
+        The select joins the index with the content table. When ``rank`` is
+        true, results are ordered by ``bm25()``. Any additional keyword
+        arguments are passed to :py:class:`~sqlize.builder.Select`, and the
+        returned select can be further modified as usual.
+        """
+        if what is None:
+            what = '{}.*'.format(self.content)
+        sets = From(self.name)
+        sets.join(self.content, on='{}.{} = {}.rowid'.format(
+            self.content, self.content_rowid, self.name))
+        select = Select(what, sets=sets, **kwargs)
+        select.where.and_(self.match(param))
+        if rank:
+            select.order.parts.insert(0, self.bm25())
+        return select
+
+    def serialize(self):
+        return '\n'.join([self.create()] + self.triggers())
@@ -0,0 +1,184 @@
+"""
+immutable.py: Immutable queries with cheap derivation
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+from .builder import (Select, From, Where, Group, Order, Window, Windows,
+                      With)
+
+
+class Frozen(object):
+    """ Mixin that makes SQL objects immutable once constructed
+
+    Methods that would modify the object in place return a modified copy
+    instead. Copies are shallow: unchanged attributes, clauses and parts are
+    shared with the original, so deriving a query costs time proportional to
+    the clause being changed, not to the size of the whole query. Parts and
+    lists are stored as tuples, and mutable objects assigned to attributes
+    are frozen. ``copy.copy()`` returns a mutable copy, so code that copies
+    a query to modify it works with frozen queries as well.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Frozen, self).__init__(*args, **kwargs)
+        self._freeze()
+
+    def __setattr__(self, attr, val):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError("'{}' object is immutable, use replace() to "
+                                 "derive a modified copy".format(
+                                     type(self).__name__))
+        super(Frozen, self).__setattr__(attr, val)
+
+    def __delattr__(self, attr):
+        raise AttributeError("'{}' object is immutable".format(
+            type(self).__name__))
+
+    def __copy__(self):
+        return thaw(self)
+
+    def _freeze(self, attrs=None):
+        state = self.__dict__
+        for attr in state if attrs is None else attrs:
+            state[attr] = freeze(state[attr])
+        state['_frozen'] = True
+        return self
+
+    def _derive(self, **attrs):
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.__dict__.update(attrs)
+        return new
+
+    def _append(self, part):
+        if not self.__dict__.get('_frozen'):
+            # Parts are added while the object is being constructed
+            return super(Frozen, self)._append(part)
+        return self._derive(parts=self.parts + (freeze(part),))
+
+    def replace(self, **attrs):
+        """ Return a copy with ``attrs`` set to new values
+
+        Values are converted the same way as when passed to the constructor.
+        """
+        new = self._derive()
+        del new.__dict__['_frozen']
+        for attr, val in attrs.items():
+            setattr(new, attr, val)
+        return new._freeze(attrs)
+
+
+class FrozenFrom(Frozen, From):
+    pass
+
+
+class FrozenWhere(Frozen, Where):
+    __and__ = Where.and_
+    __or__ = Where.or_
+
+
+class FrozenGroup(Frozen, Group):
+    pass
+
+
+class FrozenOrder(Frozen, Order):
+    __add__ = Order.asc
+    __sub__ = Order.desc
+
+
+class FrozenWindow(Frozen, Window):
+
+    def partition_by(self, term):
+        return self._derive(partition=self.partition + (term,))
+
+    def _set_frame(self, kind, start, end):
+        new = self._derive(_frozen=False)
+        Window._set_frame(new, kind, start, end)
+        return new._freeze(['frame'])
+
+
+class FrozenWindows(Frozen, Windows):
+    pass
+
+
+class FrozenWith(Frozen, With):
+    pass
+
+
+class FrozenSelect(Frozen, Select):
+    """ Immutable version of :py:class:`~sqlize.builder.Select`
+
+    Clauses are converted to their immutable versions, so ``where.and_()``,
+    ``sets.join()``, ``order.desc()`` and similar methods return new clauses
+    instead of modifying the query. Use :py:meth:`replace` to derive a query
+    that uses them::
+
+        >>> q = FrozenSelect(sets='foo', where='a = ?')
+        >>> q2 = q.replace(where=q.where.and_('b = ?'), limit=10)
+
+    """
+
+    clauses = dict(Select.clauses, sets=FrozenFrom, where=FrozenWhere,
+                   group=FrozenGroup, order=FrozenOrder, with_=FrozenWith,
+                   windows=FrozenWindows)
+
+    def count(self, what='COUNT(*)'):
+        return freeze(super(FrozenSelect, self).count(what))
+
+    def exists(self):
+        return freeze(super(FrozenSelect, self).exists())
+
+
+FROZEN = {
+    From: FrozenFrom,
+    Where: FrozenWhere,
+    Group: FrozenGroup,
+    Order: FrozenOrder,
+    Window: FrozenWindow,
+    Windows: FrozenWindows,
+    With: FrozenWith,
+    Select: FrozenSelect,
+}
+
+MUTABLE = dict((frozen, cls) for cls, frozen in FROZEN.items())
+
+
+def freeze(obj):
+    """ Return an immutable version of ``obj``
+
+    Lists and tuples are converted to tuples of frozen items. Queries and
+    clauses are copied as their frozen counterparts, while objects that
+    are already frozen and other values are returned as is.
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(item) for item in obj)
+    cls = FROZEN.get(type(obj))
+    if cls is None:
+        return obj
+    new = object.__new__(cls)
+    new.__dict__.update(obj.__dict__)
+    return new._freeze()
+
+
+def thaw(obj):
+    """ Return a mutable copy of frozen ``obj``
+
+    Tuples held by the object become lists, and frozen clauses are thawed
+    as well. Other values are returned as is.
+    """
+    cls = MUTABLE.get(type(obj))
+    if cls is None:
+        return obj
+    new = object.__new__(cls)
+    for attr, val in obj.__dict__.items():
+        if attr == '_frozen':
+            continue
+        if isinstance(val, tuple):
+            val = [thaw(item) for item in val]
+        new.__dict__[attr] = thaw(val)
+    return new
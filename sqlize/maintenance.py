@@ -0,0 +1,199 @@
+"""
+maintenance.py: Write volume driven database maintenance
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import threading
+from collections import deque, OrderedDict
+
+from .builder import Insert, Update, Delete
+from .compat import timer
+
+
+ANALYZE = 'analyze'
+OPTIMIZE = 'optimize'
+INCREMENTAL_VACUUM = 'incremental_vacuum'
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Step(object):
+    """ Maintenance step that was run, and how long it took """
+
+    def __init__(self, action, target, elapsed, finished):
+        self.action = action
+        self.target = target
+        self.elapsed = elapsed
+        self.finished = finished
+
+    def as_dict(self):
+        return {'action': self.action, 'target': self.target,
+                'elapsed': self.elapsed, 'finished': self.finished}
+
+    def __repr__(self):
+        return '<Step {} {} in {:.3f} ms>'.format(self.action, self.target,
+                                                  self.elapsed * 1000)
+
+
+class Maintenance(object):
+    """ Schedule maintenance based on the number of rows written
+
+    Rows affected by ``Insert``, ``Replace``, ``Update`` and ``Delete``
+    statements executed through :py:meth:`execute` and
+    :py:meth:`executemany` are counted per table. When a table reaches
+    ``analyze_rows`` changed rows, it is scheduled for ``ANALYZE``. Changes
+    not covered by that are added up over all tables, and ``PRAGMA
+    optimize`` is scheduled when they reach ``optimize_rows``. Deletes and
+    updates schedule a check of the free list, and databases with
+    incremental auto-vacuum get ``vacuum_step`` pages released at a time
+    while at least ``vacuum_pages`` pages are free.
+
+    Nothing runs by itself. The application calls :py:meth:`run` or
+    :py:meth:`run_if_idle` when it has nothing else to do, and the pending
+    steps run until the time ``budget`` is used up. ``ANALYZE`` is limited by
+    ``PRAGMA analysis_limit``, so each step stays short even for large
+    tables. Steps that were run are kept in :py:attr:`history`.
+    """
+
+    def __init__(self, analyze_rows=1000, optimize_rows=10000,
+                 vacuum_pages=64, vacuum_step=16, analysis_limit=400,
+                 idle_time=1.0, history=100):
+        self.analyze_rows = analyze_rows
+        self.optimize_rows = optimize_rows
+        self.vacuum_pages = vacuum_pages
+        self.vacuum_step = vacuum_step
+        self.analysis_limit = analysis_limit
+        self.idle_time = idle_time
+        self.changes = OrderedDict()
+        self.total = 0
+        self.freed = 0
+        self.last_activity = None
+        self.history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, table, rows, frees=False):
+        """ Count ``rows`` changed in ``table``
+
+        ``frees`` indicates that the change may release database pages.
+        """
+        with self._lock:
+            self.last_activity = timer()
+            if rows <= 0:
+                return
+            self.changes[table] = self.changes.get(table, 0) + rows
+            self.total += rows
+            if frees:
+                self.freed += rows
+
+    def _record(self, stmt, cursor):
+        if isinstance(stmt, (Insert, Update, Delete)):
+            self.record(stmt.table, cursor.rowcount,
+                        isinstance(stmt, (Update, Delete)))
+        else:
+            self.record(None, 0)
+
+    def execute(self, conn, stmt, params=()):
+        """ Execute ``stmt`` on a connection or cursor and count the rows it
+        changed """
+        cursor = conn.execute(str(stmt), params)
+        self._record(stmt, cursor)
+        return cursor
+
+    def executemany(self, conn, stmt, seq_of_params):
+        cursor = conn.executemany(str(stmt), seq_of_params)
+        self._record(stmt, cursor)
+        return cursor
+
+    @property
+    def pending(self):
+        """ List of ``(action, target)`` steps that are due """
+        with self._lock:
+            steps = [(ANALYZE, table) for table, rows in sorted(
+                self.changes.items(), key=lambda i: -i[1])
+                if rows >= self.analyze_rows]
+            if self.total >= self.optimize_rows:
+                steps.append((OPTIMIZE, None))
+            if self.freed:
+                steps.append((INCREMENTAL_VACUUM, None))
+        return steps
+
+    @property
+    def idle(self):
+        """ Whether no statements were executed for ``idle_time`` seconds """
+        if self.last_activity is None:
+            return True
+        return timer() - self.last_activity >= self.idle_time
+
+    def _analyze(self, conn, table):
+        with self._lock:
+            self.total -= self.changes.pop(table, 0)
+        conn.execute('ANALYZE {};'.format(table))
+        return True
+
+    def _optimize(self, conn, target):
+        conn.execute('PRAGMA optimize;')
+        with self._lock:
+            self.changes.clear()
+            self.total = 0
+        return True
+
+    def _vacuum(self, conn, target):
+        """ Release a batch of free pages, and return ``False`` if there was
+        nothing to do """
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum;').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL or \
+                free < self.vacuum_pages:
+            with self._lock:
+                self.freed = 0
+            return False
+        # The pragma releases one page per result row
+        conn.execute('PRAGMA incremental_vacuum({:d});'.format(
+            self.vacuum_step)).fetchall()
+        return True
+
+    def run(self, conn, budget=0.05):
+        """ Run pending steps on ``conn`` for up to ``budget`` seconds
+
+        A step that was started is allowed to finish, so the budget can be
+        exceeded by the duration of one step. Nothing is run while the
+        connection has an open transaction. Returns the list of steps that
+        were run.
+        """
+        if getattr(conn, 'in_transaction', False):
+            return []
+        actions = {ANALYZE: self._analyze, OPTIMIZE: self._optimize,
+                   INCREMENTAL_VACUUM: self._vacuum}
+        conn.execute('PRAGMA analysis_limit = {:d};'.format(
+            self.analysis_limit))
+        start = timer()
+        steps = []
+        pending = self.pending
+        while pending and timer() - start < budget:
+            action, target = pending[0]
+            step_start = timer()
+            if actions[action](conn, target):
+                finished = timer()
+                steps.append(Step(action, target, finished - step_start,
+                                  finished))
+            pending = self.pending
+        self.history.extend(steps)
+        return steps
+
+    def run_if_idle(self, conn, budget=0.05):
+        """ Run pending steps if the database has been idle """
+        if not self.idle:
+            return []
+        return self.run(conn, budget)
+
+    def report(self):
+        return {
+            'pending': self.pending,
+            'changes': dict(self.changes),
+            'history': [s.as_dict() for s in self.history],
+        }
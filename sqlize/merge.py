@@ -0,0 +1,328 @@
+"""
+merge.py: Merging results of a select executed in several parts
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import re
+import copy
+import heapq
+
+
+MERGEABLE = ('COUNT', 'SUM', 'TOTAL', 'MIN', 'MAX')
+AGGREGATES = MERGEABLE + ('AVG', 'GROUP_CONCAT')
+CALL_RE = re.compile(r'\b(\w+)\s*\(')
+DISTINCT_RE = re.compile(r'^DISTINCT\b', re.I)
+ALIAS_RE = re.compile(r'\s+AS\s+', re.I)
+QUALIFIED_RE = re.compile(r'^\w+\.(\w+)$')
+QUOTES = {"'": "'", '"': '"', '`': '`', '[': ']'}
+
+
+def column_name(expr):
+    """ Return the name a result column gets for select list item ``expr`` """
+    parts = ALIAS_RE.split(expr.strip())
+    if len(parts) > 1:
+        return parts[-1].strip()
+    return parts[0]
+
+
+def unqualified(name):
+    """ Return ``name`` without the table name if it is a plain
+    ``table.column`` reference """
+    match = QUALIFIED_RE.match(name)
+    return match.group(1) if match else name
+
+
+def unique_names(names):
+    """ Return ``names`` with names that occur more than once suffixed with
+    their position """
+    names = list(names)
+    dupes = set(n for n in names if names.count(n) > 1)
+    return ['{}_{}'.format(n, i) if n in dupes else n
+            for i, n in enumerate(names)]
+
+
+def column_expr(expr):
+    return ALIAS_RE.split(expr.strip())[0].strip()
+
+
+def find_column(names, term):
+    """ Return the index of the result column matching order ``term`` """
+    if term in names:
+        return names.index(term)
+    bare = term.rsplit('.', 1)[-1]
+    for i, name in enumerate(names):
+        if name.rsplit('.', 1)[-1] == bare:
+            return i
+    raise ValueError("Order term '{}' is not among the selected "
+                     "columns".format(term))
+
+
+class SortKey(object):
+    """ Sort key for rows ordered on several columns in mixed directions
+
+    ``NULL`` values sort before any other value, as they do in SQLite.
+    """
+    __slots__ = ('row', 'columns')
+
+    def __init__(self, row, columns):
+        self.row = row
+        self.columns = columns
+
+    def __lt__(self, other):
+        for idx, desc in self.columns:
+            a = self.row[idx]
+            b = other.row[idx]
+            if a == b:
+                continue
+            if a is None:
+                less = True
+            elif b is None:
+                less = False
+            else:
+                less = a < b
+            return not less if desc else less
+        return False
+
+
+def order_columns(order, names):
+    columns = []
+    for term in order.parts:
+        desc = term.startswith('-')
+        if term[:1] in '+-':
+            term = term[1:]
+        columns.append((find_column(names, term.strip()), desc))
+    return columns
+
+
+def _closing(sql, start):
+    """ Return index of the parenthesis closing the one at ``start`` """
+    depth = 0
+    for i in range(start, len(sql)):
+        if sql[i] == '(':
+            depth += 1
+        elif sql[i] == ')':
+            depth -= 1
+            if not depth:
+                return i
+    return len(sql)
+
+
+def _has_comma(sql):
+    """ Return ``True`` if ``sql`` has a comma outside of parentheses """
+    depth = 0
+    for c in sql:
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == ',' and not depth:
+            return True
+    return False
+
+
+def split_items(sql):
+    """ Return items of comma-separated list ``sql``
+
+    Commas within parentheses and quotes do not separate items.
+    """
+    items = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, c in enumerate(sql):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in QUOTES:
+            quote = QUOTES[c]
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == ',' and not depth:
+            items.append(sql[start:i].strip())
+            start = i + 1
+    items.append(sql[start:].strip())
+    return items
+
+
+def select_items(stmt):
+    """ Return select list items of ``stmt``, with comma-separated strings
+    split into separate items """
+    items = []
+    for expr in stmt._what:
+        if hasattr(expr, 'strip'):
+            items.extend(split_items(expr))
+        else:
+            items.append(expr)
+    return items
+
+
+def aggregate_calls(expr):
+    """ Return ``(function, start, end, argument)`` of aggregate calls in
+    ``expr``
+
+    ``MIN`` and ``MAX`` with several arguments are scalar functions, and are
+    not included.
+    """
+    calls = []
+    for match in CALL_RE.finditer(expr):
+        func = match.group(1).upper()
+        if func not in AGGREGATES:
+            continue
+        end = _closing(expr, match.end() - 1)
+        arg = expr[match.end():end].strip()
+        if func in ('MIN', 'MAX') and _has_comma(arg):
+            continue
+        calls.append((func, match.start(), end + 1, arg))
+    return calls
+
+
+def is_distinct(stmt):
+    what = stmt._what
+    return bool(what) and hasattr(what[0], 'strip') and \
+        bool(DISTINCT_RE.match(what[0].strip()))
+
+
+def find_aggregates(stmt):
+    """ Return ``(index, function)`` pairs for aggregates in select list
+
+    Only items that consist of a single ``COUNT``, ``SUM``, ``TOTAL``,
+    ``MIN`` or ``MAX`` call without ``DISTINCT`` can be combined from partial
+    results. ``ValueError`` is raised for any other item that uses an
+    aggregate.
+    """
+    aggregates = []
+    for i, expr in enumerate(select_items(stmt)):
+        if not hasattr(expr, 'strip'):
+            continue
+        expr = column_expr(expr)
+        calls = aggregate_calls(expr)
+        if not calls:
+            continue
+        func, start, end, arg = calls[0]
+        if len(calls) > 1 or start or end != len(expr) or \
+                func not in MERGEABLE or DISTINCT_RE.match(arg):
+            raise ValueError("Aggregate '{}' cannot be combined from partial "
+                             "results".format(expr))
+        aggregates.append((i, func))
+    return aggregates
+
+
+def combine(func, a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if func == 'MIN':
+        return min(a, b)
+    if func == 'MAX':
+        return max(a, b)
+    return a + b
+
+
+class PartialSelect(object):
+    """ Select that is executed in parts whose results are merged
+
+    The :py:attr:`partial` select is run on each part of the data (a shard,
+    a range of rows), and the results are passed to :py:meth:`merge` as a
+    list of ``(column_names, rows)`` pairs. Ordered results are combined with
+    a k-way merge, limits are widened to ``limit + offset`` for each part and
+    applied after merging. Simple aggregates (``COUNT``, ``SUM``, ``TOTAL``,
+    ``MIN`` and ``MAX``) are combined, with any non-aggregate columns treated
+    as group keys. Rows of grouped and ``DISTINCT`` selects without
+    aggregates are deduplicated. Grouping terms that are not selected are
+    added to the partial select list and removed from merged rows.
+    """
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+        self.aggregates = find_aggregates(stmt)
+        having = stmt._group.having if stmt.group else None
+        if having and (self.aggregates or aggregate_calls(having)):
+            raise ValueError('HAVING cannot be evaluated on partial '
+                             'aggregates')
+        self.unique = not self.aggregates and bool(stmt.group or
+                                                   is_distinct(stmt))
+        self.partial = copy.copy(stmt)
+        self.keys = self._group_keys(stmt)
+        if self.keys:
+            self.partial.what = stmt._what + self.keys
+        if self.aggregates:
+            self.partial.order = None
+            self.partial.limit = None
+            self.partial.offset = None
+        elif stmt.limit:
+            # Each part may hold all of the rows in the requested page
+            self.partial.limit = stmt.limit + (stmt.offset or 0)
+            self.partial.offset = None
+
+    @staticmethod
+    def _group_keys(stmt):
+        """ Return grouping terms that are not in the select list """
+        if not stmt.group:
+            return []
+        selected = set()
+        for expr in select_items(stmt):
+            if hasattr(expr, 'strip'):
+                selected.update((column_expr(expr), column_name(expr)))
+        return [t for t in stmt._group.parts
+                if t not in selected and not t.isdigit()]
+
+    def merge(self, results):
+        if self.aggregates:
+            rows = self._merge_aggregates(results)
+        elif self.stmt.order:
+            columns = order_columns(self.stmt._order, results[0][0])
+            # Each part returns rows already sorted, so a k-way merge is
+            # enough to produce the global order.
+            streams = [[SortKey(row, columns) for row in part_rows]
+                       for _, part_rows in results]
+            rows = [key.row for key in heapq.merge(*streams)]
+        else:
+            rows = []
+            for _, part_rows in results:
+                rows.extend(part_rows)
+        if self.unique:
+            rows = self._dedupe(rows)
+        if self.keys:
+            width = -len(self.keys)
+            rows = [row[:width] for row in rows]
+        offset = self.stmt.offset or 0
+        if self.stmt.limit:
+            return rows[offset:offset + self.stmt.limit]
+        return rows[offset:]
+
+    @staticmethod
+    def _dedupe(rows):
+        seen = set()
+        unique = []
+        for row in rows:
+            if row not in seen:
+                seen.add(row)
+                unique.append(row)
+        return unique
+
+    def _merge_aggregates(self, results):
+        agg_idx = dict(self.aggregates)
+        combined = {}
+        for _, part_rows in results:
+            for row in part_rows:
+                group = tuple(v for i, v in enumerate(row)
+                              if i not in agg_idx)
+                if group not in combined:
+                    combined[group] = list(row)
+                    continue
+                acc = combined[group]
+                for idx, func in self.aggregates:
+                    acc[idx] = combine(func, acc[idx], row[idx])
+        rows = [tuple(r) for r in combined.values()]
+        if self.stmt.order:
+            columns = order_columns(self.stmt._order, results[0][0])
+            rows.sort(key=lambda row: SortKey(row, columns))
+        return rows
@@ -0,0 +1,148 @@
+"""
+parallel.py: Parallel execution of selects over rowid ranges
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import copy
+import sqlite3
+import multiprocessing
+
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
+
+from .builder import Select, Where
+from .merge import PartialSelect
+
+
+def connect_readonly(path):
+    """ Open ``path`` for reading only
+
+    URI filenames are not supported by Python 2, where the connection is
+    restricted with ``PRAGMA query_only`` instead.
+    """
+    try:
+        return sqlite3.connect(
+            'file:{}?mode=ro'.format(pathname2url(path)), uri=True)
+    except TypeError:
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA query_only = ON;')
+        return conn
+
+
+def _scan(task):
+    path, sql, params = task
+    conn = connect_readonly(path)
+    try:
+        cursor = conn.execute(sql, params)
+        return [d[0] for d in cursor.description], cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def rowid_range(conn, table, rowid='rowid'):
+    """ Return ``(min, max)`` rowid of ``table`` """
+    query = Select(['MIN({})'.format(rowid), 'MAX({})'.format(rowid)],
+                   sets=table)
+    return conn.execute(str(query)).fetchone()
+
+
+def split_range(lo, hi, parts):
+    """ Split the inclusive range ``lo..hi`` into ``parts`` half-open ranges
+    of roughly equal size """
+    size = hi - lo + 1
+    parts = max(1, min(parts, size))
+    bounds = [lo + size * i // parts for i in range(parts)] + [hi + 1]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def restrict(stmt, rowid, start, end):
+    """ Return a copy of ``stmt`` limited to rows with ``start <= rowid <
+    end``
+
+    The original conditions are parenthesized, so they keep their meaning
+    even if they use ``OR``. The bounds are integers and are rendered
+    inline, so parameters of the original query are not affected.
+    """
+    part = copy.copy(stmt)
+    conditions = []
+    if stmt.where:
+        conditions.append(stmt._where.as_condition())
+    conditions.append('{} >= {:d}'.format(rowid, start))
+    conditions.append('{} < {:d}'.format(rowid, end))
+    part.where = Where(*conditions)
+    return part
+
+
+class ParallelScanner(object):
+    """ Execute selects over a database using a pool of processes
+
+    Each select is split into ranges of the scanned table's rowid (or integer
+    primary key), and every range is executed on a separate read-only
+    connection in a worker process. Results are merged as described in
+    :py:class:`~sqlize.merge.PartialSelect`.
+    """
+
+    def __init__(self, path, workers=None, pool=None):
+        self.path = path
+        self.workers = workers or multiprocessing.cpu_count()
+        self._pool = pool
+        self._own_pool = pool is None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        return self._pool
+
+    @staticmethod
+    def _table(stmt):
+        try:
+            table = stmt._from.parts[0][1]
+        except IndexError:
+            table = None
+        if not hasattr(table, 'split'):
+            raise ValueError('Scanned table must be specified for selects '
+                             'without a table name in FROM')
+        return table.split()[0]
+
+    def select(self, stmt, params=(), table=None, rowid='rowid',
+               partitions=None):
+        """ Return rows for ``stmt`` executed in parallel
+
+        The scanned table defaults to the first table in ``FROM``. When the
+        query has joins, ``rowid`` should be qualified with the table name.
+        By default, there is one partition per worker.
+        """
+        table = table or self._table(stmt)
+        conn = connect_readonly(self.path)
+        try:
+            lo, hi = rowid_range(conn, table, rowid.split('.')[-1])
+        finally:
+            conn.close()
+        partial = PartialSelect(stmt)
+        if lo is None:
+            ranges = [(0, 0)]
+        else:
+            ranges = split_range(lo, hi, partitions or self.workers)
+        tasks = [(self.path, str(restrict(partial.partial, rowid, s, e)),
+                  params) for s, e in ranges]
+        return partial.merge(self.pool.map(_scan, tasks))
+
+    def close(self):
+        if self._pool is not None and self._own_pool:
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
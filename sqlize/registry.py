@@ -0,0 +1,184 @@
+"""
+registry.py: Named queries rendered once and prepared at startup
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import io
+import json
+import sqlite3
+from collections import OrderedDict
+
+from .compat import text_type, timer
+
+
+CACHE_VERSION = 1
+QUOTES = {"'": "'", '"': '"', '`': '`', '[': ']'}
+NAME_PREFIXES = ':@$'
+
+
+def placeholders(sql):
+    """ Return ``(positional_count, names)`` of parameters used in ``sql``
+
+    String literals, quoted identifiers and comments are skipped.
+    """
+    count = 0
+    names = []
+    i = 0
+    size = len(sql)
+    while i < size:
+        c = sql[i]
+        if c in QUOTES:
+            end = sql.find(QUOTES[c], i + 1)
+            i = size if end == -1 else end + 1
+            continue
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = size if end == -1 else end + 1
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = size if end == -1 else end + 2
+            continue
+        if c == '?':
+            j = i + 1
+            while j < size and sql[j].isdigit():
+                j += 1
+            if j > i + 1:
+                count = max(count, int(sql[i + 1:j]))
+            else:
+                count += 1
+            i = j
+            continue
+        if c in NAME_PREFIXES and i + 1 < size and \
+                (sql[i + 1].isalnum() or sql[i + 1] == '_'):
+            j = i + 1
+            while j < size and (sql[j].isalnum() or sql[j] == '_'):
+                j += 1
+            if sql[i + 1:j] not in names:
+                names.append(sql[i + 1:j])
+            i = j
+            continue
+        i += 1
+    return count, names
+
+
+def null_params(sql):
+    """ Return parameters that bind ``NULL`` to every placeholder """
+    count, names = placeholders(sql)
+    if names:
+        return dict((n, None) for n in names)
+    return (None,) * count
+
+
+class Registry(object):
+    """ Collection of named queries rendered to SQL once
+
+    Queries are rendered when they are added, so no serialization happens
+    while handling requests. The rendered SQL can be saved to a cache file
+    and loaded at startup without importing or rendering the query objects.
+    :py:meth:`prepare` compiles every query on a connection, loading the
+    schema and validating the queries before the first request.
+    """
+
+    def __init__(self):
+        self.queries = OrderedDict()
+        self.render_times = OrderedDict()
+        self.prepare_times = OrderedDict()
+        self.load_time = 0.0
+
+    def add(self, name, query):
+        """ Render ``query`` and store it under ``name`` """
+        if name in self.queries:
+            raise KeyError("Query '{}' is already registered".format(name))
+        start = timer()
+        sql = text_type(query)
+        self.render_times[name] = timer() - start
+        self.load_time += self.render_times[name]
+        self.queries[name] = sql
+        return sql
+
+    def update(self, queries):
+        for name, query in queries.items():
+            self.add(name, query)
+        return self
+
+    def __getitem__(self, name):
+        return self.queries[name]
+
+    def __contains__(self, name):
+        return name in self.queries
+
+    def __iter__(self):
+        return iter(self.queries)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def execute(self, conn, name, params=()):
+        return conn.execute(self.queries[name], params)
+
+    def save(self, path):
+        data = {'version': CACHE_VERSION, 'queries': self.queries}
+        text = json.dumps(data, ensure_ascii=False)
+        if not isinstance(text, text_type):
+            # Python 2 returns a byte string when all queries are byte strings
+            text = text.decode('utf-8')
+        with io.open(path, 'w', encoding='utf-8') as fd:
+            fd.write(text)
+
+    @classmethod
+    def load(cls, path):
+        """ Return a registry with queries loaded from a cache file """
+        start = timer()
+        with io.open(path, 'r', encoding='utf-8') as fd:
+            data = json.load(fd, object_pairs_hook=OrderedDict)
+        if data.get('version') != CACHE_VERSION:
+            raise ValueError('Unsupported query cache version')
+        registry = cls()
+        registry.queries = data['queries']
+        registry.load_time = timer() - start
+        return registry
+
+    def prepare(self, conn):
+        """ Compile all queries on ``conn`` and return per-query timings
+
+        Each query is compiled as ``EXPLAIN`` with ``NULL`` parameters, so
+        statements are parsed and planned, but not executed.
+        """
+        timings = OrderedDict()
+        for name, sql in self.queries.items():
+            start = timer()
+            conn.execute('EXPLAIN ' + sql, null_params(sql)).fetchone()
+            timings[name] = timer() - start
+        self.prepare_times = timings
+        return timings
+
+    def connect(self, database, **kwargs):
+        """ Return a connection whose statement cache fits all queries, with
+        queries prepared """
+        kwargs.setdefault('cached_statements', max(len(self.queries), 100))
+        conn = sqlite3.connect(database, **kwargs)
+        self.prepare(conn)
+        return conn
+
+    def report(self):
+        return {
+            'queries': len(self.queries),
+            'load_time': self.load_time,
+            'render_times': dict(self.render_times),
+            'prepare_time': sum(self.prepare_times.values()),
+            'prepare_times': dict(self.prepare_times),
+        }
+
+    def __str__(self):
+        lines = ['{} queries loaded in {:.3f} ms'.format(
+            len(self.queries), self.load_time * 1000)]
+        for name, elapsed in self.prepare_times.items():
+            lines.append('{}: prepared in {:.3f} ms'.format(
+                name, elapsed * 1000))
+        return '\n'.join(lines)
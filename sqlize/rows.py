@@ -0,0 +1,119 @@
+"""
+rows.py: Row factories generated from select lists
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import re
+import keyword
+from collections import namedtuple
+
+from .merge import column_name, select_items, unique_names, unqualified
+
+
+NON_WORD_RE = re.compile(r'\W+')
+
+_classes = {}
+_factories = {}
+
+
+def field_name(name):
+    """ Return a valid attribute name for result column ``name`` """
+    field = NON_WORD_RE.sub('_', name).strip('_') or 'col'
+    if field[0].isdigit():
+        field = 'col_' + field
+    if keyword.iskeyword(field):
+        field += '_'
+    return field
+
+
+def field_names(names):
+    """ Return unique attribute names for result columns ``names``
+
+    Table names are dropped from ``table.column`` names, and other
+    expressions are used whole. Names that are used more than once, such as
+    ``id`` of several joined tables, get the column position as suffix.
+    """
+    return unique_names(field_name(unqualified(n)) for n in names)
+
+
+def select_names(stmt):
+    """ Return result column names of ``stmt``, or ``None`` if they can only
+    be known after execution
+
+    Names are derived from the select list, using aliases where present.
+    Strings with several comma-separated items are split. Select lists with
+    ``*`` or subqueries without an alias need the cursor description.
+    """
+    if not hasattr(stmt, '_what'):
+        return None
+    names = []
+    for expr in select_items(stmt):
+        if hasattr(expr, 'as_subquery'):
+            if not expr.alias:
+                return None
+            names.append(expr.alias)
+            continue
+        name = column_name(expr)
+        if name.endswith('*'):
+            return None
+        names.append(name)
+    return names or None
+
+
+def row_class(names):
+    """ Return a named tuple class for rows with columns ``names``
+
+    Classes are created once per set of names and cached.
+    """
+    key = tuple(names)
+    cls = _classes.get(key)
+    if cls is None:
+        cls = _classes[key] = namedtuple('Row', field_names(key))
+    return cls
+
+
+def row_factory(names):
+    """ Return a cached ``sqlite3`` row factory producing :py:func:`row_class`
+    instances """
+    key = tuple(names)
+    factory = _factories.get(key)
+    if factory is None:
+        cls = row_class(key)
+        new = tuple.__new__
+
+        def factory(cursor, row):
+            return new(cls, row)
+
+        _factories[key] = factory
+    return factory
+
+
+def install(cursor, stmt=None):
+    """ Install a row factory for ``stmt`` on ``cursor`` and return cursor
+
+    When the names can't be derived from ``stmt``, or don't match the
+    columns of an executed cursor, they are taken from the cursor
+    description, so in that case the cursor must already be executed.
+    """
+    names = select_names(stmt) if stmt is not None else None
+    description = cursor.description
+    if description and (names is None or len(names) != len(description)):
+        names = [d[0] for d in description]
+    if names is None:
+        raise ValueError('Column names are not known before the query is '
+                         'executed')
+    cursor.row_factory = row_factory(names)
+    return cursor
+
+
+def execute(cursor, stmt, params=()):
+    """ Execute ``stmt`` and install a matching row factory on ``cursor`` """
+    cursor.execute(str(stmt), params)
+    if cursor.description:
+        install(cursor, stmt)
+    return cursor
@@ -0,0 +1,216 @@
+"""
+sharding.py: Routing statements across several SQLite databases
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import zlib
+import sqlite3
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .builder import Select
+from .merge import PartialSelect
+
+
+class Result(object):
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def set(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._event.set()
+
+    def get(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class ShardWorker(threading.Thread):
+    """ Thread that owns the connection to a single shard
+
+    All operations on a shard are executed by its worker, so writes to a
+    shard are serialized and the connection is reused.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        super(ShardWorker, self).__init__()
+        self.daemon = True
+        self.path = path
+        self.timeout = timeout
+        self.queue = queue.Queue()
+
+    def run(self):
+        try:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+        except Exception as exc:
+            self.fail(exc)
+            return
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                fn, result = item
+                try:
+                    result.set(fn(conn))
+                except Exception as exc:
+                    result.set(error=exc)
+        finally:
+            conn.close()
+
+    def fail(self, exc):
+        """ Fail all queued and future operations with ``exc`` until the
+        worker is stopped """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            item[1].set(error=exc)
+
+    def submit(self, fn):
+        result = Result()
+        self.queue.put((fn, result))
+        return result
+
+    def stop(self):
+        self.queue.put(None)
+
+
+def _query(sql, params):
+    def run(conn):
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description or []]
+        return names, cursor.fetchall()
+    return run
+
+
+def _write(sql, params, many=False):
+    def run(conn):
+        try:
+            if many:
+                cursor = conn.executemany(sql, params)
+            else:
+                cursor = conn.execute(sql, params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.rowcount
+    return run
+
+
+class ShardRouter(object):
+    """ Route statements to shards stored in separate SQLite files
+
+    Writes are routed to a single shard using a key extracted from
+    parameters. ``key`` is a parameter name for named parameters, an index
+    for positional parameters, or a callable that takes the parameters and
+    returns the key. Selects without a key are executed on all shards in
+    parallel and the results are merged.
+    """
+
+    def __init__(self, paths, key, timeout=10.0):
+        self.paths = list(paths)
+        self.key = key
+        self.workers = [ShardWorker(p, timeout) for p in self.paths]
+        for worker in self.workers:
+            worker.start()
+
+    def extract_key(self, params):
+        if callable(self.key):
+            return self.key(params)
+        try:
+            return params[self.key]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError('Could not extract shard key {!r} from '
+                             'parameters'.format(self.key))
+
+    def shard_for(self, key):
+        """ Return index of the shard that stores rows for ``key`` """
+        if isinstance(key, bool) or not isinstance(key, int):
+            key = zlib.crc32(str(key).encode('utf-8')) & 0xffffffff
+        return key % len(self.workers)
+
+    def _worker(self, params, key):
+        if key is None:
+            key = self.extract_key(params)
+        return self.workers[self.shard_for(key)]
+
+    def execute(self, stmt, params=(), key=None):
+        """ Execute a write statement on a single shard
+
+        Returns the number of affected rows. The shard is selected using
+        ``key`` if given, otherwise the key is extracted from ``params``.
+        """
+        fn = _write(str(stmt), params)
+        return self._worker(params, key).submit(fn).get()
+
+    def executemany(self, stmt, seq_of_params):
+        """ Execute a write statement for each set of parameters
+
+        Parameters are grouped by shard and each shard executes its group in
+        a single transaction, in parallel with the other shards.
+        """
+        groups = {}
+        for params in seq_of_params:
+            idx = self.shard_for(self.extract_key(params))
+            groups.setdefault(idx, []).append(params)
+        sql = str(stmt)
+        results = [self.workers[idx].submit(_write(sql, group, many=True))
+                   for idx, group in groups.items()]
+        return sum(r.get() for r in results)
+
+    def broadcast(self, stmt, params=()):
+        """ Execute a write statement on all shards """
+        fn = _write(str(stmt), params)
+        results = [w.submit(fn) for w in self.workers]
+        return sum(r.get() for r in results)
+
+    def select(self, stmt, params=(), key=None):
+        """ Return rows for a select
+
+        If ``key`` is given, only the shard for that key is queried.
+        Otherwise, the query runs on all shards, and results are merged
+        honoring the statement's order, limit and offset. Simple aggregates
+        (``COUNT``, ``SUM``, ``TOTAL``, ``MIN`` and ``MAX``) are combined,
+        with any non-aggregate columns treated as group keys.
+        """
+        if key is not None:
+            return self.workers[self.shard_for(key)].submit(
+                _query(str(stmt), params)).get()[1]
+        if not isinstance(stmt, Select):
+            return [row for _, rows in self._gather(str(stmt), params)
+                    for row in rows]
+        partial = PartialSelect(stmt)
+        return partial.merge(self._gather(str(partial.partial), params))
+
+    def _gather(self, sql, params):
+        fn = _query(sql, params)
+        results = [w.submit(fn) for w in self.workers]
+        return [r.get() for r in results]
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,266 @@
+"""
+summary.py: Incrementally maintained summary tables
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import re
+
+from .builder import SQL, Select, Update, Delete
+from .ddl import CreateTable, CreateIndex, sync_trigger, drop_synced
+from .merge import column_expr, column_name, select_items
+
+
+AGGREGATE_RE = re.compile(r'^(COUNT|SUM|MIN|MAX)\s*\(\s*(\*|\w+)\s*\)$', re.I)
+IDENT_RE = re.compile(r'^\w+$')
+WHITESPACE_RE = re.compile(r'\s+')
+
+ROW_COUNT = '_rows'
+COUNTER_TYPE = 'INTEGER NOT NULL DEFAULT 0'
+
+
+def _key(expr):
+    return WHITESPACE_RE.sub('', expr).lower()
+
+
+class Aggregate(object):
+    """ Aggregate column of a summary table and its maintenance rules """
+
+    def __init__(self, func, arg, name):
+        self.func = func
+        self.arg = arg
+        self.name = name
+
+    @property
+    def counter(self):
+        """ Name of the hidden column counting non-NULL values for SUM """
+        return '_{}_n'.format(self.name)
+
+    @property
+    def cols(self):
+        if self.func == 'SUM':
+            return [self.name, self.counter]
+        return [self.name]
+
+    def definitions(self):
+        if self.func == 'COUNT':
+            return ['{} {}'.format(self.name, COUNTER_TYPE)]
+        if self.func == 'SUM':
+            return [self.name, '{} {}'.format(self.counter, COUNTER_TYPE)]
+        return [self.name]
+
+    def exprs(self):
+        """ Expressions computing the stored columns from the base table """
+        if self.func == 'SUM':
+            return ['SUM({})'.format(self.arg), 'COUNT({})'.format(self.arg)]
+        return ['{}({})'.format(self.func, self.arg)]
+
+    def add(self, ref):
+        """ Return assignments that account for row ``ref`` being added """
+        name = self.name
+        if self.func == 'COUNT':
+            if self.arg == '*':
+                return {name: '{} + 1'.format(name)}
+            return {name: '{} + ({}.{} IS NOT NULL)'.format(
+                name, ref, self.arg)}
+        val = '{}.{}'.format(ref, self.arg)
+        if self.func == 'SUM':
+            return {
+                name: 'CASE WHEN {v} IS NULL THEN {n} '
+                      'ELSE COALESCE({n}, 0) + {v} END'.format(v=val, n=name),
+                self.counter: '{} + ({} IS NOT NULL)'.format(self.counter,
+                                                             val),
+            }
+        op = '<' if self.func == 'MIN' else '>'
+        return {name: 'CASE WHEN {v} IS NULL THEN {n} WHEN {n} IS NULL OR '
+                      '{v} {op} {n} THEN {v} ELSE {n} END'.format(
+                          v=val, n=name, op=op)}
+
+    def remove(self, ref, base, match):
+        """ Return assignments that account for row ``ref`` being removed
+
+        ``MIN`` and ``MAX`` are recomputed from the ``base`` table only when
+        the removed value was the current extreme.
+        """
+        name = self.name
+        if self.func == 'COUNT':
+            if self.arg == '*':
+                return {name: '{} - 1'.format(name)}
+            return {name: '{} - ({}.{} IS NOT NULL)'.format(
+                name, ref, self.arg)}
+        val = '{}.{}'.format(ref, self.arg)
+        if self.func == 'SUM':
+            return {
+                name: 'CASE WHEN {c} - ({v} IS NOT NULL) = 0 THEN NULL '
+                      'ELSE {n} - COALESCE({v}, 0) END'.format(
+                          c=self.counter, v=val, n=name),
+                self.counter: '{} - ({} IS NOT NULL)'.format(self.counter,
+                                                             val),
+            }
+        op = '<=' if self.func == 'MIN' else '>='
+        recompute = Select('{}({})'.format(self.func, self.arg), sets=base,
+                           where=match)
+        return {name: 'CASE WHEN {v} IS NOT NULL AND {v} {op} {n} THEN {q} '
+                      'ELSE {n} END'.format(v=val, op=op, n=name,
+                                            q=recompute.as_subquery())}
+
+
+class Summary(SQL):
+    """ Summary table maintained by triggers from a grouped select
+
+    The select must read from a single table, group by plain columns, and
+    select only the grouping columns and ``COUNT``, ``SUM``, ``MIN`` or
+    ``MAX`` aggregates of plain columns. Aggregates without an alias are
+    named after the function and column (e.g. ``sum_x``, or ``count`` for
+    ``COUNT(*)``).
+
+    Serializes to a script that creates the summary table, its index, and
+    the triggers. Use :py:meth:`rebuild` to populate the table from existing
+    data, or to repair it. :py:meth:`select` returns the query that reads
+    the summary.
+    """
+
+    def __init__(self, name, select):
+        self.name = name
+        self.select_stmt = select
+        self.base = self._base(select)
+        if select.where:
+            raise ValueError('Summaries cannot have a WHERE clause')
+        if not select.group:
+            raise ValueError('Summary select must be grouped')
+        if select._group.having:
+            raise ValueError('Summaries cannot have a HAVING clause')
+        self.group = list(select._group.parts)
+        for col in self.group:
+            if not IDENT_RE.match(col):
+                raise ValueError("Group term '{}' is not a column".format(col))
+        self.aggregates = []
+        self.what = []
+        # Summary columns by normalized select list expression and name
+        self.columns = dict((_key(col), col) for col in self.group)
+        for expr in select_items(select):
+            self.what.append(self._parse(expr))
+        self.order = [self._order_term(t) for t in select._order.parts]
+
+    @staticmethod
+    def _base(select):
+        parts = select._from.parts
+        if len(parts) != 1 or not hasattr(parts[0][1], 'split') or \
+                len(parts[0][1].split()) != 1:
+            raise ValueError('Summary select must read from a single table')
+        return parts[0][1]
+
+    def _parse(self, expr):
+        if not hasattr(expr, 'strip'):
+            raise ValueError('Summary select list cannot contain subqueries')
+        name = column_name(expr)
+        expr = column_expr(expr)
+        if expr in self.group:
+            self.columns[_key(name)] = name
+            return name if name == expr else '{} AS {}'.format(expr, name)
+        match = AGGREGATE_RE.match(expr)
+        if not match or (match.group(2) == '*' and
+                         match.group(1).upper() != 'COUNT'):
+            raise ValueError("'{}' cannot be maintained incrementally; only "
+                             "grouping columns and COUNT, SUM, MIN and MAX "
+                             "of columns are supported".format(expr))
+        func, arg = match.group(1).upper(), match.group(2)
+        if name == expr:
+            name = func.lower() if arg == '*' else '{}_{}'.format(
+                func.lower(), arg)
+        self.aggregates.append(Aggregate(func, arg, name))
+        self.columns[_key(expr)] = self.columns[_key(name)] = name
+        return name
+
+    def _order_term(self, term):
+        """ Return order ``term`` referring to the summary columns """
+        direction = term[0] if term[:1] in '+-' else ''
+        col = self.columns.get(_key(term.lstrip('+-')))
+        if col is None:
+            raise ValueError("Order term '{}' is not a grouping column or a "
+                             "selected aggregate".format(term))
+        return direction + col
+
+    @property
+    def cols(self):
+        cols = list(self.group) + [ROW_COUNT]
+        for agg in self.aggregates:
+            cols.extend(agg.cols)
+        return cols
+
+    def create(self):
+        cols = list(self.group) + ['{} {}'.format(ROW_COUNT, COUNTER_TYPE)]
+        for agg in self.aggregates:
+            cols.extend(agg.definitions())
+        return [
+            CreateTable(self.name, cols),
+            CreateIndex('{}_group'.format(self.name), self.name, self.group),
+        ]
+
+    def _match(self, ref):
+        return ['{0} IS {1}.{0}'.format(col, ref) for col in self.group]
+
+    def _add(self, ref):
+        seed = 'INSERT INTO {} ({}) SELECT {} WHERE NOT EXISTS {};'.format(
+            self.name, ', '.join(self.group),
+            ', '.join('{}.{}'.format(ref, c) for c in self.group),
+            Select('1', sets=self.name, where=self._match(ref)).as_subquery())
+        sets = {ROW_COUNT: '{} + 1'.format(ROW_COUNT)}
+        for agg in self.aggregates:
+            sets.update(agg.add(ref))
+        update = Update(self.name, where=self._match(ref), **sets)
+        return [seed, str(update)]
+
+    def _remove(self, ref):
+        sets = {ROW_COUNT: '{} - 1'.format(ROW_COUNT)}
+        for agg in self.aggregates:
+            sets.update(agg.remove(ref, self.base, self._match(ref)))
+        update = Update(self.name, where=self._match(ref), **sets)
+        cleanup = Delete(self.name, where=self._match(ref) +
+                         ['{} <= 0'.format(ROW_COUNT)])
+        return [str(update), str(cleanup)]
+
+    def triggers(self):
+        watched = list(self.group)
+        for agg in self.aggregates:
+            if agg.arg != '*' and agg.arg not in watched:
+                watched.append(agg.arg)
+        update = 'UPDATE OF {}'.format(', '.join(watched))
+        return [str(sync_trigger(self.name, suffix, self.base, event, body))
+                for suffix, event, body in (
+                    ('ai', 'INSERT', self._add('NEW')),
+                    ('ad', 'DELETE', self._remove('OLD')),
+                    ('au', update, self._remove('OLD') + self._add('NEW')),
+                )]
+
+    def drop(self):
+        return drop_synced(self.name)
+
+    def rebuild(self):
+        """ Return a script that recomputes the summary from scratch """
+        exprs = list(self.group) + ['COUNT(*)']
+        for agg in self.aggregates:
+            exprs.extend(agg.exprs())
+        query = Select(exprs, sets=self.base, group=self.group)
+        return '\n'.join([
+            str(Delete(self.name)),
+            'INSERT INTO {} ({}) {}'.format(self.name, ', '.join(self.cols),
+                                            query),
+        ])
+
+    def select(self):
+        """ Return a select reading the summary table
+
+        Ordering and limits of the original select are preserved, with
+        aggregates in order terms replaced by summary columns.
+        """
+        stmt = self.select_stmt
+        return Select(self.what, sets=self.name, order=self.order,
+                      limit=stmt.limit, offset=stmt.offset)
+
+    def serialize(self):
+        return '\n'.join([str(s) for s in self.create()] + self.triggers())
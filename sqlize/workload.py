@@ -0,0 +1,346 @@
+"""
+workload.py: Recording and replaying query workloads
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import os
+import gzip
+import json
+import math
+import base64
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+from .builder import Select, Update, Insert
+from .compat import text_type, timer
+
+
+QUERY = 'q'
+EXEC = 'x'
+BLOB = '$b'
+
+
+def encode_param(val):
+    if isinstance(val, (bytes, bytearray)) and not isinstance(val, str):
+        return {BLOB: base64.b64encode(bytes(val)).decode('ascii')}
+    return val
+
+
+def decode_param(val):
+    if isinstance(val, dict) and list(val.keys()) == [BLOB]:
+        return base64.b64decode(val[BLOB])
+    return val
+
+
+def encode_params(params):
+    if hasattr(params, 'items'):
+        return dict((k, encode_param(v)) for k, v in params.items())
+    return [encode_param(v) for v in params]
+
+
+def decode_params(params):
+    if hasattr(params, 'items'):
+        return dict((k, decode_param(v)) for k, v in params.items())
+    return [decode_param(v) for v in params]
+
+
+def open_log(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def percentile(values, pct):
+    """ Return nearest-rank percentile of already sorted ``values`` """
+    if not values:
+        return 0.0
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+class Recorder(object):
+    """ Write executed statements, their parameters and timings to a log
+
+    The log is a sequence of JSON lines. Each distinct SQL string is written
+    only once and assigned a numeric id, and executions refer to statements by
+    that id. Logs whose path ends in ``.gz`` are gzip-compressed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.statements = {}
+        self.count = 0
+        self._lock = threading.Lock()
+        self._fd = open_log(path, 'wb')
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        self._fd.write(line.encode('utf-8'))
+
+    def record(self, sql, params=(), duration=0.0):
+        sql = text_type(sql)
+        with self._lock:
+            try:
+                sid = self.statements[sql]
+            except KeyError:
+                sid = self.statements[sql] = len(self.statements)
+                self._write([QUERY, sid, sql])
+            self._write([EXEC, sid, encode_params(params),
+                         int(duration * 1000000)])
+            self.count += 1
+
+    def execute(self, cursor, statement, params=()):
+        sql = text_type(statement)
+        start = timer()
+        cursor.execute(sql, params)
+        self.record(sql, params, timer() - start)
+        return cursor
+
+    def close(self):
+        with self._lock:
+            if not self._fd.closed:
+                self._fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_log(path):
+    """ Iterate over ``(sql, params, duration)`` tuples stored in a log """
+    statements = {}
+    with open_log(path, 'rb') as fd:
+        for line in fd:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line.decode('utf-8'))
+            if entry[0] == QUERY:
+                statements[entry[1]] = entry[2]
+            elif entry[0] == EXEC:
+                yield (statements[entry[1]], decode_params(entry[2]),
+                       entry[3] / 1000000.0)
+
+
+class ReplayReport(object):
+    """ Outcome of a replay run """
+
+    percentiles = (50, 90, 95, 99)
+
+    def __init__(self, latencies, errors, elapsed, concurrency):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+        self.concurrency = concurrency
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        if not self.elapsed:
+            return 0.0
+        return self.count / self.elapsed
+
+    def percentile(self, pct):
+        return percentile(self.latencies, pct)
+
+    def as_dict(self):
+        data = {
+            'count': self.count,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+            'concurrency': self.concurrency,
+            'throughput': self.throughput,
+            'max': self.latencies[-1] if self.latencies else 0.0,
+        }
+        for pct in self.percentiles:
+            data['p{}'.format(pct)] = self.percentile(pct)
+        return data
+
+    def __str__(self):
+        data = self.as_dict()
+        lines = ['{} statements, {} errors, {} workers in {:.3f}s'.format(
+                 data['count'], data['errors'], data['concurrency'],
+                 data['elapsed']),
+                 'throughput: {:.1f} stmt/s'.format(data['throughput'])]
+        for key in ['p{}'.format(p) for p in self.percentiles] + ['max']:
+            lines.append('{}: {:.3f} ms'.format(key, data[key] * 1000))
+        return '\n'.join(lines)
+
+
+def copy_database(src, dest):
+    """ Copy database file ``src`` to ``dest``, including unmerged WAL """
+    source = sqlite3.connect(src)
+    if not hasattr(source, 'backup'):
+        source.close()
+        shutil.copyfile(src, dest)
+        return
+    target = sqlite3.connect(dest)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _replay_worker(db_path, records, latencies, errors, timeout):
+    conn = sqlite3.connect(db_path, timeout=timeout,
+                           check_same_thread=False)
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        for sql, params, _ in records:
+            start = timer()
+            try:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+            except sqlite3.Error:
+                errors.append(sql)
+                continue
+            latencies.append(timer() - start)
+    finally:
+        conn.close()
+
+
+def replay(log_path, db_path, concurrency=1, repeat=1, timeout=10.0):
+    """ Replay recorded statements against a copy of ``db_path``
+
+    Statements are distributed round-robin over ``concurrency`` threads, each
+    using its own connection in autocommit mode. The original database is
+    never touched. Returns a :py:class:`ReplayReport`.
+    """
+    records = list(read_log(log_path)) * repeat
+    tmpdir = tempfile.mkdtemp(prefix='sqlize-replay-')
+    copy_path = os.path.join(tmpdir, os.path.basename(db_path))
+    copy_database(db_path, copy_path)
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=_replay_worker,
+                                args=(copy_path, records[i::concurrency],
+                                      latencies, errors, timeout))
+               for i in range(concurrency)]
+    start = timer()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = timer() - start
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return ReplayReport(latencies, len(errors), elapsed, concurrency)
+
+
+SYNTHETIC_SCHEMA = (
+    'CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, '
+    'country TEXT, created INTEGER);',
+    'CREATE TABLE events (id INTEGER PRIMARY KEY, user_id INTEGER, '
+    'kind TEXT, value REAL, created INTEGER);',
+    'CREATE INDEX events_user_id ON events (user_id);',
+)
+SYNTHETIC_KINDS = ('view', 'click', 'share', 'purchase')
+SYNTHETIC_COUNTRIES = ('de', 'fr', 'in', 'jp', 'ng', 'us')
+
+
+def generate_dataset(path, users=1000, events=50000, seed=0):
+    """ Create a SQLite database with synthetic ``users`` and ``events`` """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        for stmt in SYNTHETIC_SCHEMA:
+            conn.execute(stmt)
+        conn.executemany(
+            'INSERT INTO users VALUES (?, ?, ?, ?);',
+            ((i, 'user{}'.format(i), rnd.choice(SYNTHETIC_COUNTRIES),
+              rnd.randint(0, 10 ** 6)) for i in range(1, users + 1)))
+        conn.executemany(
+            'INSERT INTO events VALUES (?, ?, ?, ?, ?);',
+            ((i, rnd.randint(1, users), rnd.choice(SYNTHETIC_KINDS),
+              rnd.random() * 100, rnd.randint(0, 10 ** 6))
+             for i in range(1, events + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def generate_workload(db_path, log_path, statements=1000, users=1000,
+                      seed=0):
+    """ Run a synthetic read-mostly workload against ``db_path``, recording
+    it to ``log_path`` """
+    rnd = random.Random(seed)
+    queries = (
+        (Select('*', sets='users', where='id = ?'),
+         lambda: (rnd.randint(1, users),)),
+        (Select(['kind', 'COUNT(*)', 'SUM(value)'], sets='events',
+                where='user_id = ?', group='kind'),
+         lambda: (rnd.randint(1, users),)),
+        (Select('*', sets='events', where='user_id = ?', order='-created',
+                limit=20),
+         lambda: (rnd.randint(1, users),)),
+        (Update('users', where='id = ?', country='?'),
+         lambda: (rnd.choice(SYNTHETIC_COUNTRIES), rnd.randint(1, users))),
+        (Insert('events', cols=('user_id', 'kind', 'value', 'created'),
+                vals='?, ?, ?, ?'),
+         lambda: (rnd.randint(1, users), rnd.choice(SYNTHETIC_KINDS),
+                  rnd.random() * 100, rnd.randint(0, 10 ** 6))),
+    )
+    weights = (8, 4, 6, 1, 1)
+    pool = [q for q, w in zip(queries, weights) for _ in range(w)]
+    conn = sqlite3.connect(db_path)
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        with Recorder(log_path) as recorder:
+            for _ in range(statements):
+                query, params = rnd.choice(pool)
+                recorder.execute(cursor, query, params()).fetchall()
+    finally:
+        conn.close()
+    return log_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m sqlize.workload',
+        description='Record and replay sqlize workloads on SQLite')
+    sub = parser.add_subparsers(dest='command')
+    gen = sub.add_parser('generate', help='create synthetic database and log')
+    gen.add_argument('db')
+    gen.add_argument('log')
+    gen.add_argument('--users', type=int, default=1000)
+    gen.add_argument('--events', type=int, default=50000)
+    gen.add_argument('--statements', type=int, default=1000)
+    gen.add_argument('--seed', type=int, default=0)
+    rep = sub.add_parser('replay', help='replay a log against a database copy')
+    rep.add_argument('log')
+    rep.add_argument('db')
+    rep.add_argument('-c', '--concurrency', type=int, default=1)
+    rep.add_argument('-r', '--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate_dataset(args.db, args.users, args.events, args.seed)
+        generate_workload(args.db, args.log, args.statements, args.users,
+                          args.seed)
+        print('wrote {} and {}'.format(args.db, args.log))
+    elif args.command == 'replay':
+        print(replay(args.log, args.db, args.concurrency, args.repeat))
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
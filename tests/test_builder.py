@@ -202,6 +202,17 @@ def test_where_bool():
     assert sql
 
 
+def test_where_non_ascii():
+    sql = mod.Where(u"name = '\u017eaba'", u"b = '\u017e'")
+    assert sql.serialize() == u"WHERE name = '\u017eaba' AND b = '\u017e'"
+
+
+def test_where_as_condition():
+    assert mod.Where().as_condition() == ''
+    sql = mod.Where('a = 1', 'b = 2', use_or=True)
+    assert sql.as_condition() == '(a = 1 OR b = 2)'
+
+
 def test_group_by():
     sql = mod.Group('foo')
     assert str(sql) == 'GROUP BY foo'
@@ -563,3 +574,339 @@ def test_insert_withot_vals_and_cols():
 def test_replace():
     sql = mod.Replace('foo', ':foo, :bar')
     assert str(sql) == 'REPLACE INTO foo VALUES (:foo, :bar);'
+
+
+def test_select_count():
+    sql = mod.Select('*', sets='foo', where='a = ?', order='-b', limit=10,
+                     offset=20)
+    assert str(sql.count()) == 'SELECT COUNT(*) FROM foo WHERE a = ?;'
+
+
+def test_select_count_custom_what():
+    sql = mod.Select('*', sets='foo')
+    assert str(sql.count('COUNT(*) AS total')) == \
+        'SELECT COUNT(*) AS total FROM foo;'
+
+
+def test_select_count_grouped():
+    sql = mod.Select(['a', 'COUNT(*)'], sets='foo', where='b = ?',
+                     group='a', order='a', limit=5)
+    assert str(sql.count()) == ('SELECT COUNT(*) FROM (SELECT a, COUNT(*) '
+                                'FROM foo WHERE b = ? GROUP BY a);')
+
+
+def test_select_count_distinct():
+    sql = mod.Select('DISTINCT a', sets='foo', order='a')
+    assert str(sql.count()) == ('SELECT COUNT(*) FROM '
+                                '(SELECT DISTINCT a FROM foo);')
+
+
+def test_select_count_scalar_functions():
+    sql = mod.Select(['a', 'maximum', 'lower(b)'], sets='foo')
+    assert str(sql.count()) == 'SELECT COUNT(*) FROM foo;'
+
+
+def test_select_count_aggregate():
+    sql = mod.Select('max(x)', sets='foo', where='a = ?')
+    assert str(sql.count()) == ('SELECT COUNT(*) FROM '
+                                '(SELECT max(x) FROM foo WHERE a = ?);')
+    assert str(sql.exists()) == ('SELECT 1 FROM (SELECT max(x) FROM foo '
+                                 'WHERE a = ?) LIMIT 1;')
+
+
+def test_select_count_shares_clauses():
+    sql = mod.Select('*', sets='foo', where='a = ?')
+    count = sql.count()
+    sql.where &= 'b = ?'
+    assert str(count) == 'SELECT COUNT(*) FROM foo WHERE a = ? AND b = ?;'
+
+
+def test_select_exists():
+    sql = mod.Select('*', sets='foo', where='a = ?', order='b', limit=10)
+    assert str(sql.exists()) == 'SELECT 1 FROM foo WHERE a = ? LIMIT 1;'
+
+
+def test_select_exists_grouped():
+    sql = mod.Select('a', sets='foo', group=mod.Group('a', having='a > 1'))
+    assert str(sql.exists()) == ('SELECT 1 FROM (SELECT a FROM foo '
+                                 'GROUP BY a HAVING a > 1) LIMIT 1;')
+
+
+def test_with():
+    sql = mod.With(('foo', 'SELECT 1'))
+    assert str(sql) == 'WITH foo AS (SELECT 1)'
+
+
+def test_with_select():
+    sql = mod.With(('foo', mod.Select('a', sets='bar')))
+    assert str(sql) == 'WITH foo AS (SELECT a FROM bar)'
+
+
+def test_with_kwargs():
+    sql = mod.With(foo='SELECT 1', bar='SELECT 2')
+    assert str(sql) == 'WITH bar AS (SELECT 2), foo AS (SELECT 1)'
+
+
+def test_with_add_cols():
+    sql = mod.With()
+    sql.add('foo', 'SELECT 1, 2', cols=['a', 'b'])
+    assert str(sql) == 'WITH foo(a, b) AS (SELECT 1, 2)'
+
+
+def test_with_materialized():
+    sql = mod.With()
+    sql.add('foo', 'SELECT 1', materialized=True)
+    sql.add('bar', 'SELECT 2', materialized=False)
+    assert str(sql) == ('WITH foo AS MATERIALIZED (SELECT 1), '
+                        'bar AS NOT MATERIALIZED (SELECT 2)')
+
+
+def test_with_recursive():
+    sql = mod.With(recursive=True)
+    sql.add('cnt', 'SELECT 1 UNION ALL SELECT x + 1 FROM cnt WHERE x < ?',
+            cols='x')
+    assert str(sql) == ('WITH RECURSIVE cnt(x) AS (SELECT 1 UNION ALL '
+                        'SELECT x + 1 FROM cnt WHERE x < ?)')
+
+
+def test_with_names():
+    sql = mod.With(('foo', 'SELECT 1'), ('bar', 'SELECT 2'))
+    assert sql.names == ['foo', 'bar']
+
+
+def test_with_empty():
+    sql = mod.With()
+    assert str(sql) == ''
+    assert not sql
+
+
+def test_select_with():
+    sql = mod.Select('*', sets='foo', with_={'foo': mod.Select('a', 'bar')})
+    assert str(sql) == 'WITH foo AS (SELECT a FROM bar) SELECT * FROM foo;'
+
+
+def test_select_with_attr_join():
+    sql = mod.Select('*', sets='foo')
+    sql.with_.add('top', mod.Select('id', 'bar', limit=10))
+    sql.sets.join('top', using='id')
+    assert str(sql) == ('WITH top AS (SELECT id FROM bar LIMIT 10) '
+                        'SELECT * FROM foo JOIN top USING (id);')
+
+
+def test_select_with_count():
+    sql = mod.Select('*', sets='foo', with_=[('foo', 'SELECT 1')],
+                     order='a')
+    assert str(sql.count()) == ('WITH foo AS (SELECT 1) '
+                                'SELECT COUNT(*) FROM foo;')
+
+
+def test_update_with():
+    sql = mod.Update('foo', where='id IN (SELECT id FROM old)', bar='?',
+                     with_=[('old', 'SELECT id FROM foo WHERE t < ?')])
+    assert str(sql) == ('WITH old AS (SELECT id FROM foo WHERE t < ?) '
+                        'UPDATE foo SET bar = ? '
+                        'WHERE id IN (SELECT id FROM old);')
+
+
+def test_delete_with():
+    sql = mod.Delete('foo', where='id IN old', with_=[('old', 'SELECT 1')])
+    assert str(sql) == ('WITH old AS (SELECT 1) '
+                        'DELETE FROM foo WHERE id IN old;')
+
+
+def test_insert_with():
+    sql = mod.Insert('foo', '?', with_=[('bar', 'SELECT 1')])
+    assert str(sql) == 'WITH bar AS (SELECT 1) INSERT INTO foo VALUES (?);'
+
+
+def test_with_recursive_runs_on_sqlite():
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    with_ = mod.With(recursive=True)
+    with_.add('cnt', 'SELECT 1 UNION ALL SELECT x + 1 FROM cnt WHERE x < ?',
+              cols='x', materialized=True)
+    sql = mod.Select('SUM(x)', sets='cnt', with_=with_)
+    assert conn.execute(str(sql), (10,)).fetchone() == (55,)
+
+
+def test_window():
+    sql = mod.Window(partition='foo', order='-bar')
+    assert str(sql) == 'PARTITION BY foo ORDER BY bar DESC'
+
+
+def test_window_multi():
+    sql = mod.Window(partition=['foo', 'baz'], order=['bar', '-baz'])
+    assert str(sql) == 'PARTITION BY foo, baz ORDER BY bar ASC, baz DESC'
+
+
+def test_window_empty():
+    sql = mod.Window()
+    assert str(sql) == ''
+
+
+def test_window_order_attr():
+    sql = mod.Window()
+    sql.order.desc('foo')
+    sql.partition_by('bar')
+    assert str(sql) == 'PARTITION BY bar ORDER BY foo DESC'
+
+
+def test_window_rows():
+    sql = mod.Window(order='foo')
+    sql.rows(mod.Window.UNBOUNDED_PRECEDING, mod.Window.CURRENT_ROW)
+    assert str(sql) == ('ORDER BY foo ASC ROWS BETWEEN UNBOUNDED PRECEDING '
+                        'AND CURRENT ROW')
+
+
+def test_window_range_start_only():
+    sql = mod.Window(order='foo').range('1 PRECEDING')
+    assert str(sql) == 'ORDER BY foo ASC RANGE 1 PRECEDING'
+
+
+def test_window_base():
+    sql = mod.Window(base='w', frame='ROWS 2 PRECEDING')
+    assert str(sql) == 'w ROWS 2 PRECEDING'
+
+
+def test_over():
+    assert mod.over('SUM(x)', 'w') == 'SUM(x) OVER w'
+
+
+def test_over_window():
+    window = mod.Window(partition='foo')
+    assert mod.over('SUM(x)', window, alias='total') == \
+        'SUM(x) OVER (PARTITION BY foo) AS total'
+
+
+def test_window_over():
+    sql = mod.Window(order='-foo').over('ROW_NUMBER()', 'rn')
+    assert sql == 'ROW_NUMBER() OVER (ORDER BY foo DESC) AS rn'
+
+
+def test_windows():
+    sql = mod.Windows(('w', mod.Window(partition='foo')),
+                      ('v', 'w ORDER BY bar'))
+    assert str(sql) == ('WINDOW w AS (PARTITION BY foo), '
+                        'v AS (w ORDER BY bar)')
+
+
+def test_windows_empty():
+    sql = mod.Windows()
+    assert str(sql) == ''
+    assert not sql
+
+
+def test_select_windows():
+    sql = mod.Select(['foo', mod.over('SUM(bar)', 'w')], sets='baz',
+                     where='a = ?', windows={'w': mod.Window(order='foo')},
+                     order='foo', limit=10)
+    assert str(sql) == ('SELECT foo, SUM(bar) OVER w FROM baz WHERE a = ? '
+                        'WINDOW w AS (ORDER BY foo ASC) ORDER BY foo ASC '
+                        'LIMIT 10;')
+
+
+def test_select_windows_attr():
+    sql = mod.Select(['foo', mod.over('SUM(bar)', 'w')], sets='baz')
+    sql.windows.add('w', mod.Window(partition='foo'))
+    assert str(sql) == ('SELECT foo, SUM(bar) OVER w FROM baz '
+                        'WINDOW w AS (PARTITION BY foo);')
+
+
+def test_window_runs_on_sqlite():
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (g INTEGER, v INTEGER);')
+    conn.executemany('INSERT INTO foo VALUES (?, ?);',
+                     [(1, 1), (1, 2), (1, 3), (2, 10), (2, 20)])
+    window = mod.Window(partition='g', order='v')
+    window.rows(mod.Window.UNBOUNDED_PRECEDING, mod.Window.CURRENT_ROW)
+    sql = mod.Select(['g', 'v', mod.over('SUM(v)', 'w', 'total'),
+                      mod.over('ROW_NUMBER()', 'r', 'rn')],
+                     sets='foo', windows=[('w', window),
+                                          ('r', 'PARTITION BY g '
+                                                'ORDER BY v DESC')],
+                     order=['g', 'v'])
+    assert conn.execute(str(sql)).fetchall() == [
+        (1, 1, 1, 3), (1, 2, 3, 2), (1, 3, 6, 1), (2, 10, 10, 2),
+        (2, 20, 30, 1)]
+
+
+def test_compound():
+    sql = mod.Compound(mod.Select('a', 'foo'), mod.Select('a', 'bar'))
+    assert str(sql) == 'SELECT a FROM foo UNION ALL SELECT a FROM bar;'
+
+
+def test_compound_operator():
+    sql = mod.Compound(mod.Select('a', 'foo'), mod.Select('a', 'bar'),
+                       operator=mod.UNION)
+    assert str(sql) == 'SELECT a FROM foo UNION SELECT a FROM bar;'
+
+
+def test_compound_methods():
+    sql = mod.Compound(mod.Select('a', 'foo'))
+    sql.union(mod.Select('a', 'bar')).intersect('SELECT a FROM baz;')
+    sql.except_(mod.Select('a', 'qux')).union_all(mod.Select('a', 'foo'))
+    assert str(sql) == ('SELECT a FROM foo UNION SELECT a FROM bar '
+                        'INTERSECT SELECT a FROM baz '
+                        'EXCEPT SELECT a FROM qux '
+                        'UNION ALL SELECT a FROM foo;')
+
+
+def test_compound_order_limit():
+    sql = mod.Compound(mod.Select('a', 'foo'), mod.Select('a', 'bar'),
+                       order='-a', limit=10, offset=5)
+    assert str(sql) == ('SELECT a FROM foo UNION ALL SELECT a FROM bar '
+                        'ORDER BY a DESC LIMIT 10 OFFSET 5;')
+
+
+def test_compound_order_attr():
+    sql = mod.Compound(mod.Select('a', 'foo'))
+    sql.order.asc('a')
+    sql.limit = 3
+    assert str(sql) == 'SELECT a FROM foo ORDER BY a ASC LIMIT 3;'
+
+
+def test_compound_wraps_ordered_branch():
+    sql = mod.Compound(mod.Select('a', 'foo', order='a', limit=2),
+                       mod.Select('a', 'bar'))
+    assert str(sql) == ('SELECT * FROM (SELECT a FROM foo ORDER BY a ASC '
+                        'LIMIT 2) UNION ALL SELECT a FROM bar;')
+
+
+def test_compound_wraps_nested_compound():
+    inner = mod.Compound(mod.Select('a', 'bar'), mod.Select('a', 'baz'))
+    sql = mod.Compound(mod.Select('a', 'foo'), operator=mod.EXCEPT)
+    sql.except_(inner)
+    assert str(sql) == ('SELECT a FROM foo EXCEPT SELECT * FROM '
+                        '(SELECT a FROM bar UNION ALL SELECT a FROM baz);')
+
+
+def test_compound_with():
+    sql = mod.Compound(mod.Select('a', 'foo'), mod.Select('a', 'bar'),
+                       with_=[('foo', 'SELECT 1 AS a')])
+    assert str(sql) == ('WITH foo AS (SELECT 1 AS a) SELECT a FROM foo '
+                        'UNION ALL SELECT a FROM bar;')
+
+
+def test_compound_as_subquery():
+    sql = mod.Compound(mod.Select('a', 'foo'), mod.Select('a', 'bar'))
+    outer = mod.Select('COUNT(*)', sets=mod.From(sql))
+    assert str(outer) == ('SELECT COUNT(*) FROM (SELECT a FROM foo '
+                          'UNION ALL SELECT a FROM bar);')
+
+
+def test_compound_empty():
+    sql = mod.Compound()
+    assert not sql
+    assert len(mod.Compound(mod.Select('a'))) == 1
+
+
+def test_compound_many_branches_runs_on_sqlite():
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (a INTEGER);')
+    conn.executemany('INSERT INTO foo VALUES (?);', [(i,) for i in range(500)])
+    sql = mod.Compound(*[mod.Select('a', 'foo', where='a = ?')
+                         for _ in range(300)], order='-a', limit=3)
+    result = conn.execute(str(sql), list(range(300))).fetchall()
+    assert result == [(299,), (298,), (297,)]
@@ -0,0 +1,149 @@
+import array
+import math
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import columnar
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (id INTEGER, x REAL, name TEXT, '
+                 'n INTEGER);')
+    conn.executemany('INSERT INTO foo VALUES (?, ?, ?, ?);',
+                     [(i, i / 2.0, 'n{}'.format(i), None if i % 2 else i)
+                      for i in range(25)])
+    yield conn.cursor()
+    conn.close()
+
+
+def test_infer_type():
+    assert columnar.infer_type(1) == columnar.INT
+    assert columnar.infer_type(1.0) == columnar.FLOAT
+    assert columnar.infer_type('a') is columnar.OBJECT
+    assert columnar.infer_type(True) is columnar.OBJECT
+
+
+def test_int_holds_64_bit_values():
+    col = columnar.Column('a')
+    col.extend((1, 2 ** 40))
+    assert col.typecode == columnar.INT
+    assert list(col.data) == [1, 2 ** 40]
+
+
+def test_column_widens_to_float():
+    col = columnar.Column('a')
+    col.extend((1, 2))
+    col.extend((3, 4.5, None))
+    assert col.typecode == columnar.FLOAT
+    assert list(col.data[:4]) == [1.0, 2.0, 3.0, 4.5]
+    assert math.isnan(col.data[4])
+
+
+def test_column_leading_nulls():
+    col = columnar.Column('a')
+    col.extend((None, None))
+    col.extend((1.5,))
+    assert col.typecode == columnar.FLOAT
+    assert len(col.data) == 3
+
+
+@pytest.mark.parametrize('values,expected', [
+    ([1, 2, 'a', None], [1, 2, 'a', None]),
+    ([1.5, None, b'x'], [1.5, None, b'x']),
+    ([1, None, 2.5, 'a'], [1.0, None, 2.5, 'a']),
+])
+def test_column_mixed_types(values, expected):
+    col = columnar.Column('a')
+    for val in values:
+        col.extend([val])
+    assert col.typecode is columnar.OBJECT
+    assert col.data == expected
+
+
+def test_fetch_columns_mixed_types(cursor):
+    cursor.execute("UPDATE foo SET x = 'text' WHERE id = 20;")
+    sql = mod.Select(['id', 'x'], 'foo', where='id >= ?')
+    result = columnar.fetch_columns(cursor, sql, (18,), batch_size=2,
+                                    use_numpy=False)
+    assert result['x'] == [9.0, 9.5, 'text', 10.5, 11.0, 11.5, 12.0]
+
+
+def test_column_explicit_type_rejects_null():
+    col = columnar.Column('a', 'i')
+    col.extend((1, 2))
+    with pytest.raises(ValueError):
+        col.extend((3, None))
+    assert list(col.data) == [1, 2]
+
+
+def test_select_names(cursor):
+    sql = mod.Select(['foo.id', 'x AS y', 'COUNT(*) as c'], 'foo')
+    cursor.execute(str(sql))
+    assert columnar.select_names(sql, cursor) == ['id', 'y', 'c']
+
+
+def test_select_names_star(cursor):
+    cursor.execute('SELECT * FROM foo;')
+    assert columnar.select_names(mod.Select('*', 'foo'), cursor) == [
+        'id', 'x', 'name', 'n']
+
+
+def test_select_names_expressions(cursor):
+    sql = mod.Select(['SUM(foo.x)', 'x + 1.5', 'foo.n AS total'], 'foo')
+    cursor.execute(str(sql))
+    assert columnar.select_names(sql, cursor) == [
+        'SUM(foo.x)', 'x + 1.5', 'total']
+
+
+def test_select_names_duplicates(cursor):
+    sql = mod.Select(['a.id', 'b.id', 'a.name'],
+                     mod.From('foo AS a').join('foo AS b', on='a.id = b.id'))
+    cursor.execute(str(sql))
+    assert columnar.select_names(sql, cursor) == ['id_0', 'id_1', 'name']
+
+
+def test_fetch_columns_array(cursor):
+    sql = mod.Select(['id', 'x', 'name', 'n'], 'foo', where='id < ?')
+    result = columnar.fetch_columns(cursor, sql, (10,), batch_size=3,
+                                    use_numpy=False)
+    assert list(result) == ['id', 'x', 'name', 'n']
+    assert result['id'] == array.array(columnar.INT, range(10))
+    assert result['x'] == array.array('d', [i / 2.0 for i in range(10)])
+    assert result['name'] == ['n{}'.format(i) for i in range(10)]
+    assert result['n'].typecode == 'd'
+    assert [v for v in result['n'] if not math.isnan(v)] == [0, 2, 4, 6, 8]
+
+
+def test_fetch_columns_types(cursor):
+    sql = mod.Select(['id', 'x'], 'foo')
+    result = columnar.fetch_columns(cursor, sql, types={'id': 'i', 'x': 'f'},
+                                    use_numpy=False)
+    assert result['id'].typecode == 'i'
+    assert result['x'].typecode == 'f'
+    assert len(result['x']) == 25
+
+
+def test_fetch_columns_empty(cursor):
+    sql = mod.Select(['id', 'x'], 'foo', where='id < 0')
+    result = columnar.fetch_columns(cursor, sql, use_numpy=False)
+    assert result == {'id': [], 'x': []}
+
+
+def test_fetch_columns_numpy(cursor):
+    numpy = pytest.importorskip('numpy')
+    sql = mod.Select(['id', 'x', 'name'], 'foo')
+    result = columnar.fetch_columns(cursor, sql, batch_size=4)
+    assert result['id'].dtype == numpy.int64
+    assert result['x'].sum() == sum(i / 2.0 for i in range(25))
+    assert result['name'].dtype == object
+
+
+def test_fetch_columns_numpy_missing(cursor, monkeypatch):
+    monkeypatch.setattr(columnar, 'numpy', None)
+    with pytest.raises(RuntimeError):
+        columnar.fetch_columns(cursor, mod.Select('id', 'foo'),
+                               use_numpy=True)
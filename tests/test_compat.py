@@ -0,0 +1,20 @@
+import io
+
+import pytest
+
+from sqlize import compat
+
+
+def test_csv_writer_writes_text():
+    out = io.StringIO()
+    writer = compat.csv_writer(out)
+    writer.writerow([u'\u017eaba', 1])
+    writer.writerows([[None, u'a,b']])
+    assert out.getvalue() == u'\u017eaba,1\r\n,"a,b"\r\n'
+
+
+@pytest.mark.skipif(not compat.PY2, reason='Python 2 only')
+def test_text_csv_writer():
+    out = io.StringIO()
+    compat.TextCSVWriter(out).writerow([u'\u017eaba', b'x'])
+    assert out.getvalue() == u'\u017eaba,x\r\n'
@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import ddl
+
+
+def test_create_table():
+    sql = ddl.CreateTable('foo', ['id INTEGER PRIMARY KEY', 'bar TEXT'])
+    assert str(sql) == ('CREATE TABLE IF NOT EXISTS foo '
+                        '(id INTEGER PRIMARY KEY, bar TEXT);')
+
+
+def test_create_table_single_col():
+    sql = ddl.CreateTable('foo', 'id INTEGER', if_not_exists=False)
+    assert str(sql) == 'CREATE TABLE foo (id INTEGER);'
+
+
+def test_create_table_constraints():
+    sql = ddl.CreateTable('foo', ['a INTEGER', 'b INTEGER'],
+                          constraints='PRIMARY KEY (a, b)')
+    assert str(sql) == ('CREATE TABLE IF NOT EXISTS foo '
+                        '(a INTEGER, b INTEGER, PRIMARY KEY (a, b));')
+
+
+def test_create_table_options():
+    sql = ddl.CreateTable('foo', ['a INTEGER PRIMARY KEY'], temporary=True,
+                          without_rowid=True, strict=True)
+    assert str(sql) == ('CREATE TEMPORARY TABLE IF NOT EXISTS foo '
+                        '(a INTEGER PRIMARY KEY) WITHOUT ROWID, STRICT;')
+
+
+def test_create_table_cols_attr():
+    sql = ddl.CreateTable('foo', 'a INTEGER')
+    sql.cols.append('b TEXT')
+    assert str(sql) == 'CREATE TABLE IF NOT EXISTS foo (a INTEGER, b TEXT);'
+
+
+def test_create_index():
+    sql = ddl.CreateIndex('foo_bar', 'foo', 'bar')
+    assert str(sql) == 'CREATE INDEX IF NOT EXISTS foo_bar ON foo (bar);'
+
+
+def test_create_index_unique_multi():
+    sql = ddl.CreateIndex('foo_bar', 'foo', ['bar', 'baz DESC'], unique=True,
+                          if_not_exists=False)
+    assert str(sql) == 'CREATE UNIQUE INDEX foo_bar ON foo (bar, baz DESC);'
+
+
+def test_create_index_expression():
+    sql = ddl.CreateIndex('foo_lower', 'foo', 'lower(name)')
+    assert str(sql) == ('CREATE INDEX IF NOT EXISTS foo_lower '
+                        'ON foo (lower(name));')
+
+
+def test_create_index_partial():
+    sql = ddl.CreateIndex('foo_bar', 'foo', 'bar', where='deleted = 0')
+    sql.where &= 'bar IS NOT NULL'
+    assert str(sql) == ('CREATE INDEX IF NOT EXISTS foo_bar ON foo (bar) '
+                        'WHERE deleted = 0 AND bar IS NOT NULL;')
+
+
+def test_create_index_where_cls():
+    sql = ddl.CreateIndex('i', 'foo', 'bar',
+                          where=mod.Where('a = 1', 'b = 1', use_or=True))
+    assert str(sql) == ('CREATE INDEX IF NOT EXISTS i ON foo (bar) '
+                        'WHERE a = 1 OR b = 1;')
+
+
+def test_drop_index():
+    assert str(ddl.DropIndex('foo')) == 'DROP INDEX IF EXISTS foo;'
+    assert str(ddl.DropIndex('foo', False)) == 'DROP INDEX foo;'
+
+
+def test_drop_table():
+    assert str(ddl.DropTable('foo')) == 'DROP TABLE IF EXISTS foo;'
+    assert str(ddl.DropTable('foo', False)) == 'DROP TABLE foo;'
+
+
+def test_create_trigger():
+    sql = ddl.CreateTrigger('foo_ai', 'foo', 'INSERT',
+                            [mod.Delete('bar'), 'SELECT 1;'])
+    assert str(sql) == ('CREATE TRIGGER IF NOT EXISTS foo_ai AFTER INSERT ON '
+                        'foo BEGIN DELETE FROM bar; SELECT 1; END;')
+    sql = ddl.CreateTrigger('foo_bd', 'foo', 'DELETE', 'SELECT 1;',
+                            timing='BEFORE', if_not_exists=False)
+    assert str(sql) == ('CREATE TRIGGER foo_bd BEFORE DELETE ON foo BEGIN '
+                        'SELECT 1; END;')
+
+
+def test_drop_trigger():
+    assert str(ddl.DropTrigger('foo')) == 'DROP TRIGGER IF EXISTS foo;'
+    assert str(ddl.DropTrigger('foo', False)) == 'DROP TRIGGER foo;'
+
+
+def test_drop_synced():
+    assert ddl.drop_synced('foo') == '\n'.join([
+        'DROP TRIGGER IF EXISTS foo_ai;',
+        'DROP TRIGGER IF EXISTS foo_ad;',
+        'DROP TRIGGER IF EXISTS foo_au;',
+        'DROP TABLE IF EXISTS foo;'])
+
+
+def test_analyze():
+    assert str(ddl.Analyze()) == 'ANALYZE;'
+    assert str(ddl.Analyze('foo')) == 'ANALYZE foo;'
+
+
+def test_schema_rejects_other_statements():
+    with pytest.raises(TypeError):
+        ddl.Schema(mod.Select())
+
+
+def test_schema_serialize():
+    schema = ddl.Schema(ddl.CreateIndex('i', 'foo', 'a'),
+                        ddl.CreateTable('foo', 'a INTEGER'))
+    assert str(schema) == ('CREATE TABLE IF NOT EXISTS foo (a INTEGER);\n'
+                           'CREATE INDEX IF NOT EXISTS i ON foo (a);')
+
+
+def test_schema_missing_indexes():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (a INTEGER, b INTEGER);')
+    conn.execute('CREATE INDEX foo_a ON foo (a);')
+    schema = ddl.Schema(
+        ddl.CreateTable('foo', ['a INTEGER', 'b INTEGER']),
+        ddl.CreateTable('bar', ['a INTEGER']),
+        ddl.CreateIndex('foo_a', 'foo', 'a'),
+        ddl.CreateIndex('foo_b', 'foo', 'b', where='b > 0'))
+    assert [i.name for i in schema.missing_indexes(conn)] == ['foo_b']
+    assert [s.name for s in schema.missing(conn)] == ['bar', 'foo_b']
+
+
+def test_schema_apply():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (a INTEGER, b INTEGER);')
+    schema = ddl.Schema(
+        ddl.CreateTable('foo', ['a INTEGER', 'b INTEGER']),
+        ddl.CreateTable('bar', ['a INTEGER PRIMARY KEY'],
+                        without_rowid=True, strict=True),
+        ddl.CreateIndex('foo_b', 'foo', 'b', where='b > 0'),
+        ddl.CreateIndex('foo_expr', 'foo', 'a + b'))
+    executed = [str(s) for s in schema.apply(conn)]
+    assert executed[-1] == 'ANALYZE foo;'
+    assert len(executed) == 4
+    assert schema.missing(conn) == []
+    assert schema.apply(conn) == []
@@ -0,0 +1,166 @@
+import io
+import csv
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import export, immutable
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, name TEXT, '
+                 'data BLOB);')
+    conn.executemany('INSERT INTO foo VALUES (?, ?, ?);',
+                     [(i, 'n{}'.format(i),
+                       sqlite3.Binary(b'\x00') if i == 1 else None)
+                      for i in range(1, 26)])
+    yield conn.cursor()
+    conn.close()
+
+
+def test_export_csv_file_like(cursor):
+    out = io.StringIO()
+    stats = export.export_csv(cursor, mod.Select(['id', 'name'], 'foo',
+                                                 where='id < ?'),
+                              out, (4,), batch_size=2)
+    assert stats.rows == 3
+    assert out.getvalue() == 'id,name\r\n1,n1\r\n2,n2\r\n3,n3\r\n'
+
+
+def test_export_csv_empty_has_header(cursor):
+    out = io.StringIO()
+    stats = export.export_csv(cursor, mod.Select('id', 'foo',
+                                                 where='id < 0'), out)
+    assert stats.rows == 0
+    assert out.getvalue() == 'id\r\n'
+
+
+def test_export_csv_without_header(cursor):
+    out = io.StringIO()
+    export.export_csv(cursor, mod.Select('id', 'foo', where='id = 1'), out,
+                      header=False)
+    assert out.getvalue() == '1\r\n'
+
+
+def test_export_non_ascii_text(cursor, tmpdir):
+    cursor.execute("UPDATE foo SET name = ? WHERE id = 1;", (u'\u017eaba',))
+    sql = mod.Select('name', 'foo', where='id = 1')
+    csv_path = str(tmpdir.join('out.csv'))
+    json_path = str(tmpdir.join('out.ndjson'))
+    export.export_csv(cursor, sql, csv_path)
+    export.export_ndjson(cursor, sql, json_path)
+    with io.open(csv_path, encoding='utf-8', newline='') as f:
+        assert f.read() == u'name\r\n\u017eaba\r\n'
+    with io.open(json_path, encoding='utf-8') as f:
+        assert json.loads(f.read()) == {'name': u'\u017eaba'}
+
+
+def test_export_ndjson_path(cursor, tmpdir):
+    path = str(tmpdir.join('out.ndjson'))
+    stats = export.export_ndjson(cursor, mod.Select('*', 'foo',
+                                                    where='id < 3'), path)
+    assert stats.rows == 2
+    with open(path) as fd:
+        rows = [json.loads(l) for l in fd]
+    assert rows == [{'id': 1, 'name': 'n1', 'data': 'AA=='},
+                    {'id': 2, 'name': 'n2', 'data': None}]
+
+
+def test_export_gzip_path(cursor, tmpdir):
+    path = str(tmpdir.join('out.csv.gz'))
+    stats = export.export_csv(cursor, mod.Select('id', 'foo'), path)
+    assert stats.rows == 25
+    with gzip.open(path, 'rt') as fd:
+        assert len(list(csv.reader(fd))) == 26
+
+
+def test_export_gzip_file_like(cursor):
+    out = io.BytesIO()
+    export.export_ndjson(cursor, mod.Select('id', 'foo', where='id = 5'),
+                         out, compress=True)
+    out.seek(0)
+    assert gzip.GzipFile(fileobj=out).read() == b'{"id":5}\n'
+
+
+def test_keyset_export(cursor):
+    out = io.StringIO()
+    sql = mod.Select(['id', 'name'], 'foo',
+                     where=mod.Where('id > ?', 'name = ?', use_or=True))
+    exporter = export.CSVExporter(cursor, sql, (3, 'n1'), keyset='id',
+                                  chunk_size=5, batch_size=2, header=False)
+    assert exporter.export(out).rows == 23
+    ids = [int(r[0]) for r in csv.reader(io.StringIO(out.getvalue()))]
+    assert ids == [1] + list(range(4, 26))
+
+
+def test_keyset_export_named_params(cursor):
+    out = io.StringIO()
+    sql = mod.Select(['id'], 'foo', where='id <= :max')
+    stats = export.export_ndjson(cursor, sql, out, {'max': 10},
+                                 keyset='id', chunk_size=3)
+    assert stats.rows == 10
+    assert [json.loads(l)['id'] for l in out.getvalue().splitlines()] == \
+        list(range(1, 11))
+
+
+def test_keyset_query(cursor):
+    sql = mod.Select(['id'], 'foo', where='a = ? OR b = ?')
+    exporter = export.Exporter(cursor, sql, keyset='id', chunk_size=10)
+    first, after, named = exporter._keyset_query()
+    assert first == 'SELECT id FROM foo WHERE a = ? OR b = ? ' \
+        'ORDER BY id ASC LIMIT 10;'
+    assert after == 'SELECT id FROM foo WHERE (a = ? OR b = ?) AND id > ? ' \
+        'ORDER BY id ASC LIMIT 10;'
+    assert named is False
+
+
+def test_keyset_export_frozen(cursor):
+    out = io.StringIO()
+    sql = immutable.FrozenSelect('id', 'foo', where='id > ?', limit=4)
+    export.export_csv(cursor, sql, out, (20,), keyset='id', chunk_size=3,
+                      header=False)
+    assert out.getvalue() == '21\r\n22\r\n23\r\n24\r\n'
+
+
+def test_keyset_requires_key_order(cursor):
+    exporter = export.Exporter(cursor, mod.Select('id', 'foo', order='-id'),
+                               keyset='id')
+    with pytest.raises(ValueError):
+        list(exporter.batches())
+
+
+def test_stats():
+    stats = export.ExportStats(100, 2.0)
+    assert stats.rows_per_sec == 50.0
+    assert export.ExportStats(1, 0).rows_per_sec == 0.0
+
+
+def test_keyset_export_limit_offset(cursor):
+    out = io.StringIO()
+    sql = mod.Select('id', 'foo', order='id', limit=5, offset=3)
+    stats = export.export_ndjson(cursor, sql, out, keyset='id', chunk_size=2,
+                                 batch_size=1)
+    assert stats.rows == 5
+    assert [json.loads(l)['id'] for l in out.getvalue().splitlines()] == \
+        list(range(4, 9))
+
+
+def test_keyset_query_offset(cursor):
+    sql = mod.Select('id', 'foo', limit=5, offset=3)
+    exporter = export.Exporter(cursor, sql, keyset='id', chunk_size=2)
+    first, after, _ = exporter._keyset_query()
+    assert first == 'SELECT id FROM foo ORDER BY id ASC LIMIT 2 OFFSET 3;'
+    assert after == 'SELECT id FROM foo WHERE id > ? ORDER BY id ASC LIMIT 2;'
+
+
+def test_keyset_missing_key_writes_nothing(cursor, tmpdir):
+    path = tmpdir.join('out.csv')
+    sql = mod.Select(['id AS key', 'name'], 'foo')
+    with pytest.raises(ValueError):
+        export.export_csv(cursor, sql, str(path), keyset='id', chunk_size=2)
+    assert not path.exists()
@@ -0,0 +1,158 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import expr
+
+
+c = expr.Columns()
+
+
+def test_comparisons():
+    assert str(c.a == '?') == 'a = ?'
+    assert str(c.a != ':a') == 'a != :a'
+    assert str(c.a < 1) == 'a < 1'
+    assert str(c.a <= '?') == 'a <= ?'
+    assert str(c.a > c.b) == 'a > b'
+    assert str(c.a >= '?') == 'a >= ?'
+    assert str(c.a == None) == 'a IS NULL'  # NOQA
+    assert str(c.a != None) == 'a IS NOT NULL'  # NOQA
+    assert str(c.a.like()) == 'a LIKE ?'
+    assert str(c.a.between()) == 'a BETWEEN ? AND ?'
+
+
+def test_in():
+    assert str(c.a.in_(3)) == 'a IN (?, ?, ?)'
+    assert str(c.a.in_([':x', ':y'])) == 'a IN (:x, :y)'
+
+
+def test_qualified_columns():
+    t = expr.Columns('t')
+    assert str(t.a == '?') == 't.a = ?'
+    assert str(t['b'] == '?') == 't.b = ?'
+
+
+def test_combining_predicates():
+    assert str((c.a == '?') & (c.b == '?')) == '(a = ? AND b = ?)'
+    assert str((c.a == '?') | 'b = 1') == '(a = ? OR b = 1)'
+    assert str('b = 1' & (c.a == '?')) == '(b = 1 AND a = ?)'
+    assert str(~(c.a == '?')) == 'NOT (a = ?)'
+    assert str(~((c.a == '?') | 'b')) == 'NOT (a = ? OR b)'
+
+
+def test_raw_parenthesized_when_compound():
+    assert str(expr.Raw('a OR b')) == '(a OR b)'
+    assert str(expr.Raw('(a OR b)')) == '(a OR b)'
+    assert str(expr.Raw('(a) OR (b)')) == '((a) OR (b))'
+    assert str(expr.Raw('a = 1')) == 'a = 1'
+    assert str(expr.Raw('a BETWEEN 1 AND 2')) == 'a BETWEEN 1 AND 2'
+    assert str(expr.Raw("a = 'x OR y'")) == "a = 'x OR y'"
+
+
+def test_predicates_in_where():
+    q = mod.Select(sets='foo', where=c.a == '?')
+    q.where &= (c.b == '?') | (c.b == 'NULL')
+    q.where |= 'c = 1'
+    assert str(q) == ('SELECT * FROM foo WHERE a = ? AND (b = ? OR b = NULL) '
+                      'OR c = 1;')
+
+
+def test_parse():
+    where = mod.Where('a', 'b')
+    where |= 'c'
+    where &= 'd'
+    assert str(expr.parse(where)) == '((a AND b) OR (c AND d))'
+
+
+def test_optimize_removes_duplicates():
+    where = mod.Where(c.a == ':a', 'b = 1', 'b  =  1', c.a == ':a')
+    assert str(expr.optimize(where)) == 'WHERE a = :a AND b = 1'
+
+
+def test_optimize_keeps_positional_duplicates():
+    where = mod.Where(c.a == '?', c.a == '?')
+    assert str(expr.optimize(where)) == 'WHERE a = ? AND a = ?'
+
+
+def test_optimize_flattens():
+    where = mod.Where(((c.a == '?') & 'b') & ('c' & (c.d == '?')))
+    assert str(expr.optimize(where)) == 'WHERE a = ? AND b AND c AND d = ?'
+    where = mod.Where(('a' | ('b' | expr.Raw('c'))), use_or=True)
+    assert str(expr.optimize(where)) == 'WHERE a OR b OR c'
+
+
+def test_optimize_merges_equalities():
+    where = mod.Where((c.a == '?') | (c.a == '?') | c.a.in_(2))
+    assert str(expr.optimize(where)) == 'WHERE a IN (?, ?, ?, ?)'
+
+
+def test_optimize_merges_across_non_positional_terms():
+    where = mod.Where((c.a == '?') | 'b = 1' | (c.a == '?'))
+    assert str(expr.optimize(where)) == 'WHERE a IN (?, ?) OR b = 1'
+
+
+def test_optimize_keeps_parameter_order():
+    where = mod.Where((c.a == '?') | 'b = ?' | (c.a == '?'))
+    assert str(expr.optimize(where)) == 'WHERE a = ? OR b = ? OR a = ?'
+    where = mod.Where((c.a == '?') | 'b = ?' | (c.a == ':x'))
+    assert str(expr.optimize(where)) == 'WHERE a IN (?, :x) OR b = ?'
+
+
+def test_optimize_merges_where_objects():
+    where = expr.optimize(mod.Where(c.a == '?') | (c.a == '?'))
+    assert str(where) == 'WHERE a IN (?, ?)'
+
+
+def test_optimize_plain_strings():
+    assert str(expr.optimize('a = 1')) == 'WHERE a = 1'
+    assert str(expr.optimize('a OR b')) == 'WHERE a OR b'
+    assert str(expr.optimize(None)) == ''
+
+
+def test_optimize_and_or_precedence():
+    where = mod.Where('a', c.b == '?')
+    where |= c.b == '?'
+    where |= 'c'
+    assert str(expr.optimize(where)) == 'WHERE (a AND b = ?) OR b = ? OR c'
+
+
+def test_optimize_leaves_unparenthesized_strings():
+    where = mod.Where('a = 1 OR b = 2', 'c = 3', 'c = 3')
+    assert str(expr.optimize(where)) == ('WHERE a = 1 OR b = 2 AND c = 3 '
+                                         'AND c = 3')
+    where = mod.Where('(a = 1 OR b = 2)', 'c = 3', 'c = 3')
+    assert str(expr.optimize(where)) == 'WHERE (a = 1 OR b = 2) AND c = 3'
+
+
+def test_optimize_between():
+    where = mod.Where('a BETWEEN ? AND ?', 'b = 1', 'b = 1')
+    assert str(expr.optimize(where)) == 'WHERE a BETWEEN ? AND ? AND b = 1'
+
+
+def test_string_equalities():
+    assert isinstance(expr.predicate('x = ?'), expr.Comparison)
+    assert isinstance(expr.predicate("t.x = 'it''s'"), expr.Comparison)
+    assert isinstance(expr.predicate('x = y + 1'), expr.Raw)
+    where = mod.Where('x = ?').or_('x = ?').or_('x = :x').or_('x=3')
+    assert str(expr.optimize(where)) == 'WHERE x IN (?, ?, :x, 3)'
+
+
+@pytest.mark.parametrize('where,params', [
+    ((c.a == '?') | (c.a == '?') | (c.b == '?'), (1, 2, 3)),
+    ((c.a == '?') | 'b = ?' | (c.a == '?'), (1, 2, 3)),
+    ((c.a == ':x') | (c.b == ':y') | (c.a == ':z'), {'x': 1, 'y': 2, 'z': 3}),
+    (((c.a == '?') | (c.a == '?')) & (c.b > '?'), (1, 2, 0)),
+    (mod.Where('a = 1 OR b = 2', 'a = 1'), ()),
+    (mod.Where('a = ?').or_('a = ?').or_('b = ?'), (1, 2, 0)),
+])
+def test_optimized_results_match(where, params):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (a, b);')
+    conn.executemany('INSERT INTO t VALUES (?, ?);',
+                     [(i % 5, i % 3) for i in range(30)])
+    q = mod.Select(sets='t', where=where, order='rowid')
+    expected = conn.execute(str(q), params).fetchall()
+    q.where = expr.optimize(q.where)
+    assert conn.execute(str(q), params).fetchall() == expected
+    assert expected
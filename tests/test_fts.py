@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import fts
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE docs (id INTEGER PRIMARY KEY, title TEXT, '
+                 'body TEXT, extra TEXT);')
+    yield conn
+    conn.close()
+
+
+def test_literal():
+    assert fts.literal("it's") == "'it''s'"
+
+
+def test_match():
+    assert fts.match('foo') == 'foo MATCH ?'
+    assert fts.match('foo', ':q') == 'foo MATCH :q'
+
+
+def test_bm25():
+    assert fts.bm25('foo') == 'bm25(foo)'
+    assert fts.bm25('foo', 10.0, 1) == 'bm25(foo, 10.0, 1)'
+
+
+def test_bm25_order():
+    sql = mod.Select('*', sets='foo', order=fts.bm25('foo'))
+    assert str(sql) == 'SELECT * FROM foo ORDER BY bm25(foo) ASC;'
+
+
+def test_snippet():
+    assert fts.snippet('foo', 1, alias='s') == \
+        "snippet(foo, 1, '<b>', '</b>', '...', 10) AS s"
+
+
+def test_highlight():
+    assert fts.highlight('foo', 0, '[', ']') == "highlight(foo, 0, '[', ']')"
+
+
+def test_create():
+    table = fts.FTSTable('docs', ['title', 'body'])
+    assert table.create() == ("CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts "
+                              "USING fts5(title, body, content='docs');")
+
+
+def test_create_options():
+    table = fts.FTSTable('docs', 'title', name='idx', content_rowid='id',
+                         tokenize='porter unicode61', prefix=[2, 3])
+    assert table.create() == (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS idx USING fts5(title, "
+        "content='docs', content_rowid='id', tokenize='porter unicode61', "
+        "prefix='2 3');")
+
+
+def test_triggers():
+    table = fts.FTSTable('docs', ['title'], content_rowid='id')
+    ai, ad, au = table.triggers()
+    assert ai == ('CREATE TRIGGER IF NOT EXISTS docs_fts_ai AFTER INSERT ON '
+                  'docs BEGIN INSERT INTO docs_fts (rowid, title) VALUES '
+                  '(new.id, new.title); END;')
+    assert 'AFTER UPDATE OF id, title ON docs' in au
+
+
+def test_search():
+    table = fts.FTSTable('docs', ['title'], content_rowid='id')
+    sql = table.search(limit=10)
+    assert str(sql) == ('SELECT docs.* FROM docs_fts JOIN docs ON '
+                        'docs.id = docs_fts.rowid WHERE docs_fts MATCH ? '
+                        'ORDER BY bm25(docs_fts) ASC LIMIT 10;')
+
+
+def test_search_without_rank():
+    table = fts.FTSTable('docs', ['title'])
+    sql = table.search('docs.title', rank=False, where='docs.extra = ?')
+    assert str(sql) == ('SELECT docs.title FROM docs_fts JOIN docs ON '
+                        'docs.rowid = docs_fts.rowid WHERE docs.extra = ? '
+                        'AND docs_fts MATCH ?;')
+
+
+def test_sync_triggers(conn):
+    table = fts.FTSTable('docs', ['title', 'body'], content_rowid='id')
+    conn.executescript(str(table))
+    conn.execute("INSERT INTO docs VALUES (1, 'hello world', 'a', '');")
+    conn.execute("INSERT INTO docs VALUES (2, 'goodbye', 'world', '');")
+    sql = table.search('docs.id')
+    assert sorted(r[0] for r in conn.execute(str(sql), ('world',))) == [1, 2]
+    conn.execute("UPDATE docs SET title = 'hello' WHERE id = 2;")
+    conn.execute("UPDATE docs SET body = 'b' WHERE id = 2;")
+    assert sorted(r[0] for r in conn.execute(str(sql), ('hello',))) == [1, 2]
+    conn.execute('DELETE FROM docs WHERE id = 1;')
+    assert [r[0] for r in conn.execute(str(sql), ('hello',))] == [2]
+    assert list(conn.execute(str(sql), ('world',))) == []
+
+
+def test_rebuild_and_snippet(conn):
+    conn.execute("INSERT INTO docs VALUES (1, 'quick brown fox', '', '');")
+    table = fts.FTSTable('docs', ['title'], content_rowid='id')
+    conn.executescript(str(table))
+    conn.execute(table.rebuild())
+    conn.execute(table.optimize())
+    sql = table.search([table.highlight(0), table.snippet(0, tokens=2)])
+    assert conn.execute(str(sql), ('brown',)).fetchall() == [
+        ('quick <b>brown</b> fox', 'quick <b>brown</b>...')]
+
+
+def test_drop(conn):
+    table = fts.FTSTable('docs', ['title'])
+    conn.executescript(str(table))
+    conn.executescript(table.drop())
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE "
+                        "'docs_fts%';").fetchone() == (0,)
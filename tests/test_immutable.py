@@ -0,0 +1,146 @@
+import copy
+
+import pytest
+
+import sqlize as mod
+from sqlize import immutable
+
+
+@pytest.fixture
+def base():
+    return immutable.FrozenSelect(sets='foo', where='a = ?', order='-b')
+
+
+def test_frozen_select_serializes_like_select(base):
+    assert str(base) == 'SELECT * FROM foo WHERE a = ? ORDER BY b DESC;'
+    assert isinstance(base.sets, immutable.FrozenFrom)
+    assert isinstance(base.where, immutable.FrozenWhere)
+    assert isinstance(base.order, immutable.FrozenOrder)
+    assert base.what == ('*',)
+
+
+def test_attributes_cannot_be_set(base):
+    with pytest.raises(AttributeError):
+        base.limit = 10
+    with pytest.raises(AttributeError):
+        base.where.parts = []
+    with pytest.raises(AttributeError):
+        del base.where
+
+
+def test_copy_is_mutable(base):
+    query = copy.copy(base)
+    assert type(query) is mod.Select
+    assert type(query.where) is mod.Where
+    query.where &= 'c = ?'
+    query.what = ['a']
+    query.limit = 5
+    assert str(query) == 'SELECT a FROM foo WHERE a = ? AND c = ? ' \
+        'ORDER BY b DESC LIMIT 5;'
+    assert str(base) == 'SELECT * FROM foo WHERE a = ? ORDER BY b DESC;'
+
+
+def test_where_and_returns_new_clause(base):
+    where = base.where.and_('c = ?')
+    assert str(where) == 'WHERE a = ? AND c = ?'
+    assert str(base.where) == 'WHERE a = ?'
+    assert where.parts[0] is base.where.parts[0]
+
+
+def test_where_operators(base):
+    assert str(base.where & 'c') == 'WHERE a = ? AND c'
+    assert str(base.where | 'c') == 'WHERE a = ? OR c'
+    where = base.where
+    where &= 'c'
+    assert str(where) == 'WHERE a = ? AND c'
+    assert str(base.where) == 'WHERE a = ?'
+
+
+def test_empty_where_and():
+    where = immutable.FrozenWhere()
+    assert str(where.and_('a')) == 'WHERE a'
+    assert str(where) == ''
+
+
+def test_from_join_returns_new_clause(base):
+    sets = base.sets.join('bar', on='foo.id = bar.id')
+    assert str(sets) == 'FROM foo JOIN bar ON foo.id = bar.id'
+    assert str(base.sets) == 'FROM foo'
+
+
+def test_order_returns_new_clause(base):
+    order = base.order.desc('c')
+    assert str(order) == 'ORDER BY b DESC, c DESC'
+    assert str(base.order + 'd') == 'ORDER BY b DESC, d ASC'
+    assert str(base.order - 'd') == 'ORDER BY b DESC, d DESC'
+    assert str(base.order) == 'ORDER BY b DESC'
+
+
+def test_replace_shares_unchanged_clauses(base):
+    q = base.replace(where=base.where & 'c', limit=10)
+    assert str(q) == ('SELECT * FROM foo WHERE a = ? AND c ORDER BY b DESC '
+                      'LIMIT 10;')
+    assert str(base) == 'SELECT * FROM foo WHERE a = ? ORDER BY b DESC;'
+    assert q.sets is base.sets
+    assert q.order is base.order
+    assert q.what is base.what
+    assert q.where.parts[0] is base.where.parts[0]
+
+
+def test_replace_converts_values(base):
+    q = base.replace(what=['a', 'b'], group='a', where=mod.Where('c'))
+    assert q.what == ('a', 'b')
+    assert isinstance(q.group, immutable.FrozenGroup)
+    assert isinstance(q.where, immutable.FrozenWhere)
+    assert str(q) == 'SELECT a, b FROM foo WHERE c GROUP BY a ORDER BY b DESC;'
+
+
+def test_replaced_query_is_frozen(base):
+    q = base.replace(limit=1)
+    with pytest.raises(AttributeError):
+        q.limit = 2
+
+
+def test_freeze_select():
+    sub = mod.Select(sets='bar', alias='b')
+    q = mod.Select(sets=mod.From('foo').join(sub, on='1'), where='a')
+    q.sets.append(sub)
+    frozen = immutable.freeze(q)
+    assert isinstance(frozen, immutable.FrozenSelect)
+    assert isinstance(frozen.sets.parts[-1][1], immutable.FrozenSelect)
+    q.where.and_('b')
+    sub.where = 'c'
+    assert str(frozen) == ('SELECT * FROM foo JOIN (SELECT * FROM bar) AS b '
+                           'ON 1 , (SELECT * FROM bar) AS b WHERE a;')
+
+
+def test_freeze_is_noop_for_frozen(base):
+    assert immutable.freeze(base) is base
+    assert immutable.freeze('foo') == 'foo'
+    assert immutable.freeze(['a', ['b']]) == ('a', ('b',))
+
+
+def test_count_and_exists_are_frozen(base):
+    assert isinstance(base.count(), immutable.FrozenSelect)
+    assert str(base.count()) == 'SELECT COUNT(*) FROM foo WHERE a = ?;'
+    assert str(base.exists()) == 'SELECT 1 FROM foo WHERE a = ? LIMIT 1;'
+
+
+def test_frozen_window():
+    w = immutable.FrozenWindow('a', order='b')
+    rows = w.rows(mod.Window.UNBOUNDED_PRECEDING)
+    assert w.frame is None
+    assert str(rows) == ('PARTITION BY a ORDER BY b ASC ROWS UNBOUNDED '
+                         'PRECEDING')
+    assert str(w.partition_by('c')) == 'PARTITION BY a, c ORDER BY b ASC'
+    assert str(w) == 'PARTITION BY a ORDER BY b ASC'
+
+
+def test_frozen_with_and_windows():
+    q = immutable.FrozenSelect(sets='t', with_=(('t', 'SELECT 1'),))
+    with_ = q.with_.add('u', 'SELECT 2')
+    assert q.with_.names == ['t']
+    assert with_.names == ['t', 'u']
+    windows = q.windows.add('w', 'ORDER BY a')
+    assert not q.windows
+    assert str(windows) == 'WINDOW w AS (ORDER BY a)'
@@ -0,0 +1,153 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import maintenance
+
+
+@pytest.fixture
+def conn(tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join('test.db')), isolation_level=None)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL;')
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, val TEXT);')
+    conn.execute('CREATE INDEX foo_val ON foo (val);')
+    conn.execute('CREATE TABLE bar (id INTEGER PRIMARY KEY);')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def maint():
+    return maintenance.Maintenance(analyze_rows=100, optimize_rows=150,
+                                   vacuum_pages=4, vacuum_step=8,
+                                   idle_time=0)
+
+
+def fill(maint, conn, rows=200):
+    maint.executemany(conn, mod.Insert('foo', '?, ?'),
+                      ((i, 'x' * 200) for i in range(rows)))
+
+
+def test_counts_changed_rows(maint, conn):
+    fill(maint, conn, 10)
+    maint.execute(conn, mod.Update('foo', 'id < ?', val='?'), ('y', 3))
+    maint.execute(conn, mod.Delete('foo', 'id = ?'), (9,))
+    maint.execute(conn, mod.Replace('bar', '?'), (1,))
+    assert maint.changes == {'foo': 14, 'bar': 1}
+    assert maint.total == 15
+    assert maint.freed == 4
+
+
+def test_selects_are_not_counted(maint, conn):
+    fill(maint, conn, 10)
+    maint.execute(conn, mod.Select(sets='foo'))
+    maint.execute(conn, mod.Delete('foo', 'id > 100'))
+    assert maint.changes == {'foo': 10}
+
+
+def test_pending(maint, conn):
+    assert maint.pending == []
+    fill(maint, conn, 120)
+    assert maint.pending == [(maintenance.ANALYZE, 'foo')]
+    maint.record('bar', 30)
+    assert maint.pending == [(maintenance.ANALYZE, 'foo'),
+                             (maintenance.OPTIMIZE, None)]
+    maint.execute(conn, mod.Delete('foo', 'id < 5'))
+    assert maint.pending[-1] == (maintenance.INCREMENTAL_VACUUM, None)
+
+
+def test_run_analyzes_tables(maint, conn):
+    fill(maint, conn)
+    steps = maint.run(conn, budget=10)
+    assert [(s.action, s.target) for s in steps] == [
+        (maintenance.ANALYZE, 'foo')]
+    assert steps[0].elapsed >= 0
+    stats = conn.execute('SELECT tbl FROM sqlite_stat1;').fetchall()
+    assert ('foo',) in stats
+    assert maint.pending == []
+    assert list(maint.history) == steps
+
+
+def test_run_optimizes(maint, conn):
+    maint.record('foo', 90)
+    maint.record('bar', 90)
+    steps = maint.run(conn, budget=10)
+    assert [s.action for s in steps] == [maintenance.OPTIMIZE]
+    assert maint.changes == {}
+    assert maint.total == 0
+
+
+def test_run_vacuums_in_steps(maint, conn):
+    fill(maint, conn)
+    maint.run(conn, budget=10)
+    maint.execute(conn, mod.Delete('foo', 'id > ?'), (10,))
+    free = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+    assert free > 8
+    steps = maint.run(conn, budget=10)
+    vacuums = [s for s in steps
+               if s.action == maintenance.INCREMENTAL_VACUUM]
+    assert len(vacuums) > 1
+    assert conn.execute('PRAGMA freelist_count;').fetchone()[0] < 4
+    assert maint.freed == 0
+    assert maint.pending == []
+
+
+def test_vacuum_skipped_without_incremental_auto_vacuum(maint, tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join('plain.db')), isolation_level=None)
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, val TEXT);')
+    fill(maint, conn)
+    maint.execute(conn, mod.Delete('foo'))
+    steps = maint.run(conn, budget=10)
+    assert maintenance.INCREMENTAL_VACUUM not in [s.action for s in steps]
+    assert maint.pending == []
+    conn.close()
+
+
+def test_run_respects_budget(maint, conn):
+    for table in ('foo', 'bar', 'baz'):
+        maint.record(table, 100)
+    conn.execute('CREATE TABLE baz (id);')
+    assert maint.run(conn, budget=0) == []
+    assert len(maint.pending) == 4
+
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, 'in_transaction'),
+                    reason='Transaction state is not exposed by sqlite3')
+def test_run_skipped_in_transaction(maint, tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join('tx.db')))
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, val TEXT);')
+    fill(maint, conn)
+    assert conn.in_transaction
+    assert maint.run(conn, budget=10) == []
+    conn.commit()
+    assert len(maint.run(conn, budget=10)) == 1
+    conn.close()
+
+
+def test_run_if_idle(maint, conn):
+    maint.idle_time = 60
+    fill(maint, conn)
+    assert not maint.idle
+    assert maint.run_if_idle(conn, budget=10) == []
+    maint.idle_time = 0
+    assert maint.idle
+    assert len(maint.run_if_idle(conn, budget=10)) == 1
+
+
+def test_analyzed_changes_do_not_count_towards_optimize(maint, conn):
+    fill(maint, conn)
+    maint.record('bar', 60)
+    steps = maint.run(conn, budget=10)
+    assert [s.action for s in steps] == [maintenance.ANALYZE]
+    assert maint.total == 60
+
+
+def test_report(maint, conn):
+    fill(maint, conn)
+    maint.record('bar', 10)
+    maint.run(conn, budget=10)
+    report = maint.report()
+    assert report['pending'] == []
+    assert report['changes'] == {'bar': 10}
+    assert [h['action'] for h in report['history']] == [maintenance.ANALYZE]
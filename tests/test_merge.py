@@ -0,0 +1,131 @@
+import pytest
+
+import sqlize as mod
+from sqlize import merge, immutable
+
+
+def test_column_name():
+    assert merge.column_name('COUNT(*) AS total') == 'total'
+    assert merge.column_name('foo.bar') == 'foo.bar'
+    assert merge.column_name('bar as baz') == 'baz'
+
+
+def test_find_column():
+    assert merge.find_column(['a', 'b'], 'b') == 1
+    assert merge.find_column(['a', 'b'], 'foo.b') == 1
+    with pytest.raises(ValueError):
+        merge.find_column(['a', 'b'], 'c')
+
+
+def test_sort_key_mixed_directions():
+    rows = [(1, 'b'), (2, 'a'), (1, 'a'), (None, 'c')]
+    columns = [(0, False), (1, True)]
+    rows.sort(key=lambda r: merge.SortKey(r, columns))
+    assert rows == [(None, 'c'), (1, 'b'), (1, 'a'), (2, 'a')]
+
+
+def test_find_aggregates():
+    sql = mod.Select(['kind', 'COUNT(*) AS n', 'max(value)', 'SUM (x)'])
+    assert merge.find_aggregates(sql) == [(1, 'COUNT'), (2, 'MAX'),
+                                          (3, 'SUM')]
+
+
+def test_split_items():
+    assert merge.split_items("a, MAX(b, c) AS m, 'x,y',[p,q]") == [
+        'a', 'MAX(b, c) AS m', "'x,y'", '[p,q]']
+
+
+def test_find_aggregates_joined_string():
+    sql = mod.Select(['kind, COUNT(*) AS n', "group_key(a, ','), SUM(x)"])
+    assert merge.find_aggregates(sql) == [(1, 'COUNT'), (3, 'SUM')]
+
+
+def test_find_aggregates_unsupported():
+    with pytest.raises(ValueError):
+        merge.find_aggregates(mod.Select('AVG(x)'))
+
+
+def test_partial_select_limit():
+    partial = merge.PartialSelect(mod.Select('*', 'foo', order='a',
+                                             limit=10, offset=5))
+    assert str(partial.partial) == 'SELECT * FROM foo ORDER BY a ASC LIMIT 15;'
+
+
+def test_partial_select_does_not_modify_original():
+    sql = mod.Select(['a', 'COUNT(*)'], 'foo', group='a', order='a', limit=1)
+    partial = merge.PartialSelect(sql)
+    assert str(partial.partial) == 'SELECT a, COUNT(*) FROM foo GROUP BY a;'
+    assert str(sql) == ('SELECT a, COUNT(*) FROM foo GROUP BY a '
+                        'ORDER BY a ASC LIMIT 1;')
+
+
+def test_partial_select_frozen():
+    sql = immutable.FrozenSelect(['a', 'COUNT(*)'], 'foo', group='b',
+                                 limit=1)
+    partial = merge.PartialSelect(sql)
+    assert str(partial.partial) == 'SELECT a, COUNT(*), b FROM foo GROUP BY b;'
+    assert partial.merge([(None, [(1, 2, 'x')]), (None, [(1, 3, 'x')])]) == [
+        (1, 5)]
+
+
+def test_merge_ordered():
+    partial = merge.PartialSelect(mod.Select('a', 'foo', order='-a',
+                                             limit=3, offset=1))
+    results = [(['a'], [(9,), (4,), (1,)]), (['a'], [(7,), (5,)])]
+    assert partial.merge(results) == [(7,), (5,), (4,)]
+
+
+def test_merge_unordered():
+    partial = merge.PartialSelect(mod.Select('a', 'foo'))
+    assert partial.merge([(['a'], [(1,)]), (['a'], [(2,)])]) == [(1,), (2,)]
+
+
+def test_merge_aggregates():
+    partial = merge.PartialSelect(mod.Select(['k', 'MIN(v)', 'TOTAL(v)'],
+                                             'foo', group='k', order='k'))
+    results = [(['k', 'MIN(v)', 'TOTAL(v)'], [('a', 1, 2.0), ('b', None, 0)]),
+               (['k', 'MIN(v)', 'TOTAL(v)'], [('b', 3, 3.0), ('a', 0, 1.0)])]
+    assert partial.merge(results) == [('a', 0, 3.0), ('b', 3, 3.0)]
+
+
+@pytest.mark.parametrize('expr', [
+    'COUNT(DISTINCT c)',
+    'SUM(v)/COUNT(*)',
+    'MAX(v) - MIN(v)',
+    'SUM(v) + 1 AS x',
+    'COALESCE(MAX(v), 0)',
+    'SUM(v) OVER (ORDER BY v)',
+    'GROUP_CONCAT(v)',
+])
+def test_find_aggregates_rejects_expressions(expr):
+    with pytest.raises(ValueError):
+        merge.find_aggregates(mod.Select(['c', expr]))
+
+
+def test_find_aggregates_scalar_min_max():
+    sql = mod.Select(['MAX(a, b)', 'MIN(SUM(v), 1)', 'SUM(MAX(a, b))'])
+    with pytest.raises(ValueError):
+        merge.find_aggregates(sql)
+    sql = mod.Select(['MAX(a, b)', 'SUM(MAX(a, b))'])
+    assert merge.find_aggregates(sql) == [(1, 'SUM')]
+
+
+def test_having_with_aggregate_rejected():
+    with pytest.raises(ValueError):
+        merge.PartialSelect(mod.Select('c', 'foo', group=mod.Group(
+            'c', having='COUNT(*) > 1')))
+
+
+def test_merge_grouped_without_aggregates():
+    partial = merge.PartialSelect(mod.Select('c', 'foo', group='c'))
+    results = [(['c'], [(1,), (2,)]), (['c'], [(2,), (3,)])]
+    assert partial.merge(results) == [(1,), (2,), (3,)]
+
+
+def test_merge_distinct():
+    partial = merge.PartialSelect(mod.Select('DISTINCT c', 'foo', order='c',
+                                             limit=2))
+    assert str(partial.partial) == ('SELECT DISTINCT c FROM foo '
+                                    'ORDER BY c ASC LIMIT 2;')
+    results = [(['c'], [(1,), (2,)]), (['c'], [(1,), (3,)])]
+    assert partial.merge(results) == [(1,), (2,)]
@@ -0,0 +1,150 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import parallel, immutable
+
+
+@pytest.fixture(scope='module')
+def db(tmpdir_factory):
+    path = str(tmpdir_factory.mktemp('parallel').join('test.db'))
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, k TEXT, '
+                 'v INTEGER);')
+    conn.executemany('INSERT INTO foo VALUES (?, ?, ?);',
+                     [(i, 'k{}'.format(i % 3), i % 17)
+                      for i in range(1, 1001)])
+    conn.execute('CREATE TABLE empty (id INTEGER PRIMARY KEY);')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope='module')
+def scanner(db):
+    scanner = parallel.ParallelScanner(db, workers=2)
+    yield scanner
+    scanner.close()
+
+
+def query(db, sql, params=()):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(str(sql), params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_connect_readonly(db):
+    conn = parallel.connect_readonly(db)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('DELETE FROM foo;')
+    finally:
+        conn.close()
+
+
+def test_connect_readonly_without_uri(db, monkeypatch):
+    connect = sqlite3.connect
+
+    def connect_without_uri(database, **kwargs):
+        if 'uri' in kwargs:
+            raise TypeError("'uri' is an invalid keyword argument")
+        return connect(database, **kwargs)
+
+    monkeypatch.setattr(sqlite3, 'connect', connect_without_uri)
+    conn = parallel.connect_readonly(db)
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM foo;').fetchone() == (1000,)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('DELETE FROM foo;')
+    finally:
+        conn.close()
+    assert query(db, 'SELECT COUNT(*) FROM foo;') == [(1000,)]
+
+
+def test_split_range():
+    assert parallel.split_range(1, 10, 3) == [(1, 4), (4, 7), (7, 11)]
+
+
+def test_split_range_small():
+    assert parallel.split_range(5, 6, 4) == [(5, 6), (6, 7)]
+
+
+def test_restrict():
+    sql = mod.Select('*', 'foo', where=mod.Where('a = ?', 'b = ?',
+                                                 use_or=True))
+    part = parallel.restrict(sql, 'rowid', 10, 20)
+    assert str(part) == ('SELECT * FROM foo WHERE (a = ? OR b = ?) '
+                         'AND rowid >= 10 AND rowid < 20;')
+    assert str(sql) == 'SELECT * FROM foo WHERE a = ? OR b = ?;'
+
+
+def test_restrict_frozen():
+    sql = immutable.FrozenSelect('*', 'foo', where='a = ?')
+    part = parallel.restrict(sql, 'rowid', 10, 20)
+    assert str(part) == ('SELECT * FROM foo WHERE (a = ?) '
+                         'AND rowid >= 10 AND rowid < 20;')
+    assert str(sql) == 'SELECT * FROM foo WHERE a = ?;'
+
+
+def test_restrict_without_where():
+    part = parallel.restrict(mod.Select('*', 'foo'), 'id', 1, 2)
+    assert str(part) == 'SELECT * FROM foo WHERE id >= 1 AND id < 2;'
+
+
+def test_rowid_range(db):
+    conn = sqlite3.connect(db)
+    assert parallel.rowid_range(conn, 'foo') == (1, 1000)
+    conn.close()
+
+
+def test_table_required():
+    with pytest.raises(ValueError):
+        parallel.ParallelScanner._table(mod.Select('1'))
+
+
+def test_select_ordered(db, scanner):
+    sql = mod.Select(['id', 'v'], 'foo', where='v > ?', order=['-v', 'id'],
+                     limit=25, offset=5)
+    assert scanner.select(sql, (3,), partitions=7) == query(db, sql, (3,))
+
+
+def test_select_unordered(db, scanner):
+    sql = mod.Select('id', 'foo', where='k = ?')
+    result = scanner.select(sql, ('k1',), rowid='id', partitions=5)
+    assert sorted(result) == query(db, sql, ('k1',))
+
+
+def test_select_aggregates(db, scanner):
+    sql = mod.Select(['k', 'COUNT(*)', 'SUM(v)', 'MAX(v)'], 'foo',
+                     group='k', order='k')
+    assert scanner.select(sql, partitions=4) == query(db, sql)
+
+
+def test_select_empty_table(scanner):
+    assert scanner.select(mod.Select('*', 'empty')) == []
+
+
+def test_select_count_distinct_rejected(scanner):
+    with pytest.raises(ValueError):
+        scanner.select(mod.Select('COUNT(DISTINCT v)', 'foo'))
+
+
+def test_select_grouped_without_aggregates(db, scanner):
+    sql = mod.Select('k', 'foo', group='k', order='k')
+    assert scanner.select(sql, partitions=4) == query(db, sql)
+
+
+def test_select_grouped_by_unselected_column(db, scanner):
+    sql = mod.Select('COUNT(*)', 'foo', group='k')
+    assert sorted(scanner.select(sql, partitions=4)) == [
+        (333,), (333,), (334,)]
+    sql = mod.Select(['MAX(id)', 'SUM(v)'], 'foo', group='k', order='k')
+    assert scanner.select(sql, partitions=4) == query(db, sql)
+
+
+def test_select_distinct(db, scanner):
+    sql = mod.Select('DISTINCT v', 'foo', order='v', limit=5, offset=3)
+    assert scanner.select(sql, partitions=4) == query(db, sql)
@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import registry
+
+
+@pytest.fixture
+def reg():
+    reg = registry.Registry()
+    reg.add('user', mod.Select('*', 'users', where='id = ?'))
+    reg.add('rename', mod.Update('users', where='id = :id', name=':name'))
+    reg.add('purge', mod.Delete('users'))
+    return reg
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);')
+    conn.execute("INSERT INTO users VALUES (1, 'foo');")
+    yield conn
+    conn.close()
+
+
+def test_placeholders():
+    assert registry.placeholders('SELECT ?, ?;') == (2, [])
+    assert registry.placeholders('SELECT ?3, ?1;') == (3, [])
+    assert registry.placeholders('SELECT :a, @b, $c, :a;') == (
+        0, ['a', 'b', 'c'])
+
+
+def test_placeholders_skip_literals_and_comments():
+    sql = ("SELECT '?', \"a?\", [b:c], `?` -- ? :x\n"
+           "/* :y ? */ FROM t WHERE a = ?;")
+    assert registry.placeholders(sql) == (1, [])
+
+
+def test_null_params():
+    assert registry.null_params('SELECT ?, ?;') == (None, None)
+    assert registry.null_params('SELECT :a;') == {'a': None}
+
+
+def test_registry_add(reg):
+    assert reg['user'] == 'SELECT * FROM users WHERE id = ?;'
+    assert 'purge' in reg
+    assert list(reg) == ['user', 'rename', 'purge']
+    assert len(reg) == 3
+    assert set(reg.render_times) == {'user', 'rename', 'purge'}
+
+
+def test_registry_duplicate(reg):
+    with pytest.raises(KeyError):
+        reg.add('user', mod.Select())
+
+
+def test_registry_update():
+    reg = registry.Registry().update({'a': mod.Select('1')})
+    assert reg['a'] == 'SELECT 1;'
+
+
+def test_prepare_does_not_execute(reg, conn):
+    timings = reg.prepare(conn)
+    assert list(timings) == ['user', 'rename', 'purge']
+    assert conn.execute('SELECT COUNT(*) FROM users;').fetchone() == (1,)
+    report = reg.report()
+    assert report['queries'] == 3
+    assert report['prepare_time'] == sum(timings.values())
+    assert 'user: prepared in' in str(reg)
+
+
+def test_prepare_invalid_query(conn):
+    reg = registry.Registry()
+    reg.add('bad', mod.Select('*', 'missing'))
+    with pytest.raises(sqlite3.OperationalError):
+        reg.prepare(conn)
+
+
+def test_execute(reg, conn):
+    assert reg.execute(conn, 'user', (1,)).fetchall() == [(1, 'foo')]
+
+
+def test_save_and_load(reg, tmpdir, conn):
+    path = str(tmpdir.join('queries.json'))
+    reg.save(path)
+    loaded = registry.Registry.load(path)
+    assert list(loaded) == list(reg)
+    assert loaded['rename'] == reg['rename']
+    assert loaded.load_time > 0
+    loaded.prepare(conn)
+
+
+def test_save_non_ascii(reg, tmpdir):
+    reg.add('greet', mod.Select(u"'\u017eaba'"))
+    path = str(tmpdir.join('queries.json'))
+    reg.save(path)
+    assert registry.Registry.load(path)['greet'] == u"SELECT '\u017eaba';"
+
+
+def test_load_wrong_version(tmpdir):
+    path = tmpdir.join('queries.json')
+    path.write('{"version": 0, "queries": {}}')
+    with pytest.raises(ValueError):
+        registry.Registry.load(str(path))
+
+
+def test_connect(reg, tmpdir):
+    path = str(tmpdir.join('test.db'))
+    sqlite3.connect(path).execute('CREATE TABLE users (id INTEGER, '
+                                  'name TEXT);')
+    conn = reg.connect(path)
+    assert len(reg.prepare_times) == 3
+    conn.close()
@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import rows
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE foo (id INTEGER PRIMARY KEY, name TEXT, '
+                 'class TEXT);')
+    conn.execute('CREATE TABLE bar (id INTEGER PRIMARY KEY, foo_id INTEGER);')
+    conn.execute("INSERT INTO foo VALUES (1, 'one', 'a');")
+    conn.execute("INSERT INTO foo VALUES (2, 'two', 'b');")
+    conn.execute('INSERT INTO bar VALUES (10, 1);')
+    yield conn
+    conn.close()
+
+
+def test_field_name():
+    assert rows.field_name('foo') == 'foo'
+    assert rows.field_name('COUNT(*)') == 'COUNT'
+    assert rows.field_name('"weird name"') == 'weird_name'
+    assert rows.field_name('_hidden') == 'hidden'
+    assert rows.field_name('1st') == 'col_1st'
+    assert rows.field_name('class') == 'class_'
+    assert rows.field_name('*') == 'col'
+
+
+def test_field_names_drop_tables_and_dedupe():
+    assert rows.field_names(['foo.id', 'bar.id', 'name']) == [
+        'id_0', 'id_1', 'name']
+
+
+def test_field_names_keep_expressions():
+    assert rows.field_names(['SUM(t.value)', 'price * 1.5', 't.price']) == [
+        'SUM_t_value', 'price_1_5', 'price']
+
+
+def test_select_names():
+    q = mod.Select(['foo.id', 'name AS n', 'COUNT(*)'], sets='foo')
+    assert rows.select_names(q) == ['foo.id', 'n', 'COUNT(*)']
+    assert rows.select_names(mod.Select(sets='foo')) is None
+    assert rows.select_names(mod.Select('foo.*', sets='foo')) is None
+    sub = mod.Select('1')
+    assert rows.select_names(mod.Select(['id', sub])) is None
+    sub.alias = 'one'
+    assert rows.select_names(mod.Select(['id', sub])) == ['id', 'one']
+
+
+def test_row_class_is_cached():
+    cls = rows.row_class(['id', 'name'])
+    assert rows.row_class(('id', 'name')) is cls
+    assert rows.row_class(['id', 'title']) is not cls
+    assert cls._fields == ('id', 'name')
+
+
+def test_row_factory_is_cached():
+    assert rows.row_factory(['id']) is rows.row_factory(['id'])
+
+
+def test_execute(conn):
+    q = mod.Select(['foo.id', 'bar.id', 'name AS n', 'class'],
+                   sets=mod.From('foo').join('bar', on='foo_id = foo.id'))
+    row = rows.execute(conn.cursor(), q).fetchone()
+    assert row == (1, 10, 'one', 'a')
+    assert row.id_0 == 1
+    assert row.id_1 == 10
+    assert row.n == 'one'
+    assert row.class_ == 'a'
+    assert row._asdict()['n'] == 'one'
+
+
+def test_execute_star_uses_description(conn):
+    q = mod.Select(sets='foo', order='id')
+    result = rows.execute(conn.cursor(), q).fetchall()
+    assert [r.name for r in result] == ['one', 'two']
+    assert type(result[0])._fields == ('id', 'name', 'class_')
+
+
+def test_execute_with_params(conn):
+    q = mod.Select('name', sets='foo', where='id = ?')
+    assert rows.execute(conn.cursor(), q, (2,)).fetchone().name == 'two'
+
+
+def test_install_before_execute(conn):
+    q = mod.Select(['id', 'name'], sets='foo', order='id')
+    cursor = rows.install(conn.cursor(), q)
+    assert cursor.execute(str(q)).fetchone().name == 'one'
+
+
+def test_install_joined_select_list(conn):
+    q = mod.Select('id, name AS n, MAX(id, 1)', sets='foo', order='id')
+    assert rows.select_names(q) == ['id', 'n', 'MAX(id, 1)']
+    cursor = rows.install(conn.cursor(), q)
+    row = cursor.execute(str(q)).fetchone()
+    assert row.n == 'one'
+    assert repr(row) == "Row(id=1, n={!r}, MAX_id_1=1)".format(row.n)
+
+
+def test_install_needs_names(conn):
+    with pytest.raises(ValueError):
+        rows.install(conn.cursor(), mod.Select(sets='foo'))
+
+
+def test_install_prefers_description_on_mismatch(conn):
+    q = mod.Select('id, name', sets='foo')
+    cursor = conn.cursor()
+    cursor.execute(str(q))
+    assert rows.install(cursor, q).fetchone().name == 'one'
+
+
+def test_execute_without_results(conn):
+    cursor = rows.execute(conn.cursor(), mod.Delete('bar'))
+    assert cursor.rowcount == 1
@@ -0,0 +1,178 @@
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import sharding
+
+
+@pytest.fixture
+def router(tmpdir):
+    paths = [str(tmpdir.join('shard{}.db'.format(i))) for i in range(3)]
+    for path in paths:
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE events (tenant INTEGER, kind TEXT, '
+                     'value INTEGER);')
+        conn.close()
+    router = sharding.ShardRouter(paths, key='tenant')
+    yield router
+    router.close()
+
+
+def populate(router):
+    insert = mod.Insert('events', cols=['tenant', 'kind', 'value'])
+    rows = [{'tenant': t, 'kind': 'k{}'.format(v % 2), 'value': v}
+            for t in range(6) for v in range(t, t + 4)]
+    assert router.executemany(insert, rows) == len(rows)
+    return rows
+
+
+def test_shard_for_is_stable(router):
+    assert router.shard_for(4) == 1
+    assert router.shard_for('tenant') == router.shard_for('tenant')
+    assert 0 <= router.shard_for('tenant') < 3
+
+
+def test_extract_key(router):
+    assert router.extract_key({'tenant': 3}) == 3
+    with pytest.raises(ValueError):
+        router.extract_key({'other': 3})
+
+
+def test_extract_key_positional(tmpdir):
+    router = sharding.ShardRouter([str(tmpdir.join('a.db'))], key=1)
+    try:
+        assert router.extract_key(('x', 5)) == 5
+    finally:
+        router.close()
+
+
+def test_connect_error_fails_operations(tmpdir):
+    path = str(tmpdir.join('missing', 'a.db'))
+    router = sharding.ShardRouter([path], key=0)
+    try:
+        for _ in range(2):
+            with pytest.raises(sqlite3.OperationalError):
+                router.execute('SELECT 1;', (1,))
+    finally:
+        router.close()
+
+
+def test_writes_are_routed(router):
+    router.execute(mod.Insert('events', cols=['tenant', 'kind', 'value']),
+                   {'tenant': 4, 'kind': 'a', 'value': 1})
+    counts = [len(router.select(mod.Select('*', 'events'), key=k))
+              for k in range(3)]
+    assert counts == [0, 1, 0]
+
+
+def test_update_with_explicit_key(router):
+    populate(router)
+    updated = router.execute(mod.Update('events', where='tenant = ?',
+                                        value='0'), (2,), key=2)
+    assert updated == 4
+    assert router.select(mod.Select('SUM(value)', 'events',
+                                    where='tenant = ?'), (2,)) == [(0,)]
+
+
+def test_broadcast(router):
+    populate(router)
+    assert router.broadcast(mod.Delete('events', where='value > ?'),
+                            (5,)) == 6
+    assert router.select(mod.Select('COUNT(*)', 'events')) == [(18,)]
+
+
+def test_select_ordered_merge(router):
+    rows = populate(router)
+    result = router.select(mod.Select(['tenant', 'value'], 'events',
+                                      order=['-value', 'tenant']))
+    expected = sorted(((r['tenant'], r['value']) for r in rows),
+                      key=lambda r: (-r[1], r[0]))
+    assert result == expected
+
+
+def test_select_ordered_limit_offset(router):
+    populate(router)
+    result = router.select(mod.Select(['tenant', 'value'], 'events',
+                                      order=['value', '-tenant'],
+                                      limit=3, offset=2))
+    assert result == [(0, 1), (2, 2), (1, 2)]
+
+
+def test_select_unordered_limit(router):
+    populate(router)
+    assert len(router.select(mod.Select('*', 'events', limit=5))) == 5
+
+
+def test_select_aggregates(router):
+    populate(router)
+    result = router.select(mod.Select(
+        ['COUNT(*)', 'SUM(value) AS total', 'MIN(value)', 'MAX(value)'],
+        'events'))
+    assert result == [(24, 96, 0, 8)]
+
+
+def test_select_grouped_aggregates(router):
+    populate(router)
+    result = router.select(mod.Select(['kind', 'COUNT(*) AS n', 'MAX(value)'],
+                                      'events', group='kind',
+                                      order='-kind', limit=1))
+    assert result == [('k1', 12, 7)]
+
+
+def test_select_grouped_by_unselected_column(router):
+    populate(router)
+    result = router.select(mod.Select('COUNT(*)', 'events', group='tenant'))
+    assert result == [(4,)] * 6
+    result = router.select(mod.Select('SUM(value)', 'events',
+                                      group='tenant', order='tenant'))
+    assert result == [(6,), (10,), (14,), (18,), (22,), (26,)]
+    result = router.select(mod.Select('1', 'events', group='tenant'))
+    assert result == [(1,)] * 6
+
+
+def test_select_joined_select_list(router):
+    populate(router)
+    result = router.select(mod.Select('COUNT(*), SUM(value)', 'events',
+                                      group='kind', order='kind'))
+    assert result == [(12, 48), (12, 48)]
+
+
+def test_select_unsupported_aggregate(router):
+    with pytest.raises(ValueError):
+        router.select(mod.Select('AVG(value)', 'events'))
+
+
+def test_select_having_rejected(router):
+    with pytest.raises(ValueError):
+        router.select(mod.Select(['kind', 'COUNT(*)'], 'events',
+                                 group=mod.Group('kind', having='1')))
+
+
+def test_errors_propagate(router):
+    with pytest.raises(sqlite3.OperationalError):
+        router.select(mod.Select('*', 'missing'))
+
+
+@pytest.mark.parametrize('expr', [
+    'COUNT(DISTINCT kind)',
+    'SUM(value)/COUNT(*)',
+    'MAX(value) - MIN(value)',
+])
+def test_select_aggregate_expressions_rejected(router, expr):
+    populate(router)
+    with pytest.raises(ValueError):
+        router.select(mod.Select(expr, 'events'))
+
+
+def test_select_grouped_without_aggregates(router):
+    populate(router)
+    result = router.select(mod.Select('kind', 'events', group='kind',
+                                      order='kind'))
+    assert result == [('k0',), ('k1',)]
+
+
+def test_select_distinct(router):
+    populate(router)
+    result = router.select(mod.Select('DISTINCT kind', 'events'))
+    assert sorted(result) == [('k0',), ('k1',)]
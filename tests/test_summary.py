@@ -0,0 +1,151 @@
+import random
+import sqlite3
+
+import pytest
+
+import sqlize as mod
+from sqlize import summary
+
+
+def make_select(**kwargs):
+    return mod.Select(['day', 'kind AS k', 'COUNT(*)', 'SUM(x) AS total',
+                       'MIN(x)', 'MAX(x)', 'COUNT(x)'],
+                      sets='events', group=['day', 'kind'],
+                      order=['day', 'k'], **kwargs)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, day INTEGER, '
+                 'kind TEXT, x INTEGER);')
+    yield conn
+    conn.close()
+
+
+def test_names():
+    s = summary.Summary('daily', make_select())
+    assert s.what == ['day', 'kind AS k', 'count', 'total', 'min_x',
+                      'max_x', 'count_x']
+    assert s.cols == ['day', 'kind', '_rows', 'count', 'total', '_total_n',
+                      'min_x', 'max_x', 'count_x']
+
+
+def test_joined_select_list(conn):
+    s = summary.Summary('daily', mod.Select('COUNT(*), SUM(x)', sets='events',
+                                            group='day'))
+    assert s.what == ['count', 'sum_x']
+    conn.executescript(str(s))
+    conn.execute('INSERT INTO events (day, x) VALUES (1, 5);')
+    assert conn.execute(str(s.select())).fetchall() == [(1, 5)]
+
+
+def test_select():
+    s = summary.Summary('daily', make_select(limit=5))
+    assert str(s.select()) == ('SELECT day, kind AS k, count, total, min_x, '
+                               'max_x, count_x FROM daily '
+                               'ORDER BY day ASC, k ASC LIMIT 5;')
+
+
+def test_select_order_by_aggregate(conn):
+    s = summary.Summary('daily', mod.Select(
+        ['day', 'COUNT(*)', 'SUM(x) AS total'], sets='events', group='day',
+        order=['-count( * )', 'sum(x)', '-day']))
+    assert str(s.select()) == ('SELECT day, count, total FROM daily '
+                               'ORDER BY count DESC, total ASC, day DESC;')
+    conn.executescript(str(s))
+    conn.executemany('INSERT INTO events (day, x) VALUES (?, ?);',
+                     [(1, 1), (2, 2), (2, 3), (3, 4)])
+    assert conn.execute(str(s.select())).fetchall() == [
+        (2, 2, 5), (1, 1, 1), (3, 1, 4)]
+
+
+def test_select_order_not_selected():
+    with pytest.raises(ValueError):
+        summary.Summary('daily', mod.Select('COUNT(*)', sets='events',
+                                            group='day', order='MAX(x)'))
+
+
+def test_create():
+    s = summary.Summary('daily', mod.Select(['day', 'COUNT(*) AS n'],
+                                            'events', group='day'))
+    table, index = s.create()
+    assert str(table) == ('CREATE TABLE IF NOT EXISTS daily (day, '
+                          '_rows INTEGER NOT NULL DEFAULT 0, '
+                          'n INTEGER NOT NULL DEFAULT 0);')
+    assert str(index) == ('CREATE INDEX IF NOT EXISTS daily_group '
+                          'ON daily (day);')
+
+
+def test_rebuild():
+    s = summary.Summary('daily', mod.Select(['day', 'MAX(x)'], 'events',
+                                            group='day'))
+    assert s.rebuild() == ('DELETE FROM daily;\nINSERT INTO daily (day, '
+                           '_rows, max_x) SELECT day, COUNT(*), MAX(x) '
+                           'FROM events GROUP BY day;')
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'what': 'AVG(x)', 'group': 'day'},
+    {'what': 'SUM(x + 1)', 'group': 'day'},
+    {'what': 'SUM(*)', 'group': 'day'},
+    {'what': 'COUNT(*)'},
+    {'what': 'COUNT(*)', 'group': 'day', 'where': 'x > 1'},
+    {'what': 'COUNT(*)', 'group': mod.Group('day', having='1')},
+    {'what': 'COUNT(*)', 'group': 'day + 1'},
+    {'what': 'COUNT(*)', 'group': 'day', 'sets': ['events', 'other']},
+])
+def test_unsupported(kwargs):
+    kwargs.setdefault('sets', 'events')
+    with pytest.raises(ValueError):
+        summary.Summary('daily', mod.Select(**kwargs))
+
+
+def test_incremental_maintenance(conn):
+    select = make_select()
+    s = summary.Summary('daily', select)
+    conn.executescript(str(s))
+    rnd = random.Random(0)
+    kinds = ['a', 'b', None]
+    for i in range(400):
+        op = rnd.random()
+        if op < 0.6:
+            conn.execute('INSERT INTO events (day, kind, x) '
+                         'VALUES (?, ?, ?);',
+                         (rnd.randint(1, 4), rnd.choice(kinds),
+                          rnd.choice([None, rnd.randint(-50, 50)])))
+        elif op < 0.8:
+            conn.execute(str(mod.Update('events', where='id = ?', x='?',
+                                        kind='?')),
+                         (rnd.choice([None, rnd.randint(-50, 50)]),
+                          rnd.choice(kinds), rnd.randint(1, i + 1)))
+        else:
+            conn.execute(str(mod.Delete('events', where='id = ?')),
+                         (rnd.randint(1, i + 1),))
+        if i % 50 == 0:
+            assert conn.execute(str(s.select())).fetchall() == \
+                conn.execute(str(select)).fetchall()
+    expected = conn.execute(str(select)).fetchall()
+    assert conn.execute(str(s.select())).fetchall() == expected
+    conn.execute('DELETE FROM events;')
+    assert conn.execute(str(s.select())).fetchall() == []
+
+
+def test_rebuild_existing_data(conn):
+    conn.executemany('INSERT INTO events (day, kind, x) VALUES (?, ?, ?);',
+                     [(1, 'a', 1), (1, 'a', 5), (2, 'b', None)])
+    select = make_select()
+    s = summary.Summary('daily', select)
+    conn.executescript(str(s))
+    conn.executescript(s.rebuild())
+    conn.execute("INSERT INTO events (day, kind, x) VALUES (2, 'b', 3);")
+    assert conn.execute(str(s.select())).fetchall() == \
+        conn.execute(str(select)).fetchall()
+
+
+def test_drop(conn):
+    s = summary.Summary('daily', make_select())
+    conn.executescript(str(s))
+    conn.executescript(s.drop())
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE "
+                        "'daily%';").fetchone() == (0,)
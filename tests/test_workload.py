@@ -0,0 +1,110 @@
+import os
+import sqlite3
+
+import sqlize as mod
+from sqlize import workload
+
+
+def test_percentile():
+    vals = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert workload.percentile(vals, 50) == 5
+    assert workload.percentile(vals, 90) == 9
+    assert workload.percentile(vals, 100) == 10
+    assert workload.percentile([], 50) == 0.0
+
+
+def test_params_roundtrip():
+    params = [1, 'foo', b'\x00\x01', None, 1.5]
+    encoded = workload.encode_params(params)
+    assert workload.decode_params(encoded) == params
+
+
+def test_named_params_roundtrip():
+    params = {'foo': b'bar', 'baz': 2}
+    encoded = workload.encode_params(params)
+    assert workload.decode_params(encoded) == params
+
+
+def test_recorder_interns_statements(tmpdir):
+    path = str(tmpdir.join('log.jsonl'))
+    with workload.Recorder(path) as rec:
+        rec.record(mod.Select('*', sets='foo', where='id = ?'), (1,), 0.5)
+        rec.record(mod.Select('*', sets='foo', where='id = ?'), (2,), 0.25)
+    with open(path) as fd:
+        assert len(fd.readlines()) == 3
+    assert list(workload.read_log(path)) == [
+        ('SELECT * FROM foo WHERE id = ?;', [1], 0.5),
+        ('SELECT * FROM foo WHERE id = ?;', [2], 0.25),
+    ]
+
+
+def test_recorder_non_ascii(tmpdir):
+    path = str(tmpdir.join('log.jsonl'))
+    with workload.Recorder(path) as rec:
+        rec.record(mod.Select(u"'\u017eaba'", sets='foo'))
+    assert list(workload.read_log(path)) == [
+        (u"SELECT '\u017eaba' FROM foo;", [], 0.0)]
+
+
+def test_recorder_gzip(tmpdir):
+    path = str(tmpdir.join('log.jsonl.gz'))
+    with workload.Recorder(path) as rec:
+        rec.record('SELECT ?;', (b'foo',), 0.001)
+    assert list(workload.read_log(path)) == [('SELECT ?;', [b'foo'], 0.001)]
+
+
+def test_recorder_execute(tmpdir):
+    path = str(tmpdir.join('log.jsonl'))
+    conn = sqlite3.connect(':memory:')
+    with workload.Recorder(path) as rec:
+        cur = rec.execute(conn.cursor(), mod.Select('?'), (3,))
+        assert cur.fetchall() == [(3,)]
+        assert rec.count == 1
+    (sql, params, duration), = workload.read_log(path)
+    assert sql == 'SELECT ?;'
+    assert params == [3]
+    assert duration >= 0
+
+
+def test_replay_leaves_original_untouched(tmpdir):
+    db = str(tmpdir.join('test.db'))
+    log = str(tmpdir.join('log.jsonl'))
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE foo (id INTEGER);')
+    conn.commit()
+    conn.close()
+    with workload.Recorder(log) as rec:
+        for i in range(10):
+            rec.record(mod.Insert('foo', '?'), (i,))
+        rec.record('SELECT * FROM missing;')
+    report = workload.replay(log, db, concurrency=2)
+    assert report.count == 10
+    assert report.errors == 1
+    assert report.concurrency == 2
+    conn = sqlite3.connect(db)
+    assert conn.execute('SELECT COUNT(*) FROM foo;').fetchone() == (0,)
+    conn.close()
+
+
+def test_synthetic_workload_replay(tmpdir):
+    db = str(tmpdir.join('synth.db'))
+    log = str(tmpdir.join('log.jsonl.gz'))
+    workload.generate_dataset(db, users=50, events=500)
+    workload.generate_workload(db, log, statements=100, users=50)
+    report = workload.replay(log, db, concurrency=4, repeat=2)
+    assert report.count == 200
+    assert report.errors == 0
+    assert report.throughput > 0
+    data = report.as_dict()
+    assert data['p50'] <= data['p99'] <= data['max']
+    assert 'throughput' in str(report)
+
+
+def test_main_generate_and_replay(tmpdir, capsys):
+    db = str(tmpdir.join('synth.db'))
+    log = str(tmpdir.join('log.jsonl'))
+    assert workload.main(['generate', db, log, '--users', '10',
+                          '--events', '50', '--statements', '20']) == 0
+    assert os.path.exists(db) and os.path.exists(log)
+    assert workload.main(['replay', log, db, '-c', '2']) == 0
+    assert '20 statements' in capsys.readouterr().out